@@ -497,17 +497,27 @@ class TreeEditor(ExtensionModelAdmin):
             return HttpResponse("FAIL")
 
         if position in ("last-child", "left", "right"):
-            try:
-                tree_manager.move_node(cut_item, pasted_on, position)
-            except InvalidMove as e:
-                self.message_user(request, "%s" % e)
-                return HttpResponse("FAIL")
-
-            # Ensure that model save methods have been run (required to
-            # update Page._cached_url values, might also be helpful for other
-            # models inheriting MPTTModel)
-            for item in queryset.filter(id__in=(cut_item.pk, pasted_on.pk)):
-                item.save()
+            if hasattr(tree_manager, "move_subtree"):
+                # Updates everything depending on the position of the moved
+                # subtree itself (f.e. BasePageManager.move_subtree)
+                try:
+                    tree_manager.move_subtree(cut_item, pasted_on, position)
+                except InvalidMove as e:
+                    self.message_user(request, "%s" % e)
+                    return HttpResponse("FAIL")
+
+            else:
+                try:
+                    tree_manager.move_node(cut_item, pasted_on, position)
+                except InvalidMove as e:
+                    self.message_user(request, "%s" % e)
+                    return HttpResponse("FAIL")
+
+                # Ensure that model save methods have been run (might be
+                # required for models inheriting MPTTModel which store values
+                # derived from their position)
+                for item in queryset.filter(id__in=(cut_item.pk, pasted_on.pk)):
+                    item.save()
 
             self.message_user(
                 request, gettext("%s has been moved to a new position.") % cut_item
@@ -127,6 +127,82 @@ FEINCMS_SINGLETON_TEMPLATE_DELETION_ALLOWED = getattr(
     settings, "FEINCMS_SINGLETON_TEMPLATE_DELETION_ALLOWED", False
 )
 
+# ------------------------------------------------------------------------
+#: Number of objects whose content blocks are kept in a process-local LRU
+#: cache by ``ContentProxy``. Only objects having a ``content_generation``
+#: field (see ``feincms.extensions.content_generation``) are cached. The
+#: default is to not cache anything.
+FEINCMS_CONTENT_CACHE_SIZE = getattr(settings, "FEINCMS_CONTENT_CACHE_SIZE", 0)
+
+# ------------------------------------------------------------------------
+#: The ct_tracker extension computes the content type inventory when objects
+#: or their content blocks are saved. Objects without a valid inventory (f.e.
+#: objects which existed before activating the extension) are rendered using
+#: the regular queries. Set this to ``True`` to save the inventory when
+#: rendering those objects instead, which means that rendering may write to
+#: the database.
+FEINCMS_CT_TRACKER_WRITE_ON_READ = getattr(
+    settings, "FEINCMS_CT_TRACKER_WRITE_ON_READ", False
+)
+
+# ------------------------------------------------------------------------
+#: Resolve page paths using a process-local table of the URLs of all active
+#: pages instead of querying the database for every request. The table is
+#: invalidated through a generation key stored in Django's cache, which
+#: therefore has to be shared between processes (f.e. memcached or redis).
+FEINCMS_PAGE_ROUTING_TABLE = getattr(settings, "FEINCMS_PAGE_ROUTING_TABLE", False)
+#: Maximum age of the routing table and of the entries of the negative
+#: lookup cache in seconds. Rebuilding the table regularly is required for
+#: active filters depending on the current time such as the one added by the
+#: datepublisher extension.
+FEINCMS_PAGE_ROUTING_TABLE_MAX_AGE = getattr(
+    settings, "FEINCMS_PAGE_ROUTING_TABLE_MAX_AGE", 300
+)
+#: Number of paths which did not match any page remembered per process, so
+#: that requests for nonexistent URLs do not hit the database every time.
+#: Uses the same generation key as the routing table for invalidation. The
+#: default is to not remember anything.
+FEINCMS_PAGE_NEGATIVE_CACHE_SIZE = getattr(
+    settings, "FEINCMS_PAGE_NEGATIVE_CACHE_SIZE", 0
+)
+
+# ------------------------------------------------------------------------
+#: When the URL of a page changes, the URLs of its subpages are updated using
+#: bulk updates. ``pre_save`` and ``post_save`` are sent for every updated
+#: subpage (with ``update_fields={"_cached_url"}``) unless this is ``False``.
+FEINCMS_PAGE_URL_CASCADE_SIGNALS = getattr(
+    settings, "FEINCMS_PAGE_URL_CASCADE_SIGNALS", True
+)
+
+# ------------------------------------------------------------------------
+#: Number of seconds ``feincms.views.Handler`` caches the responses of pages
+#: in Django's default cache. Requires the ``content_generation`` extension.
+#: The default is to not cache responses.
+FEINCMS_RESPONSE_CACHE_TIMEOUT = getattr(settings, "FEINCMS_RESPONSE_CACHE_TIMEOUT", 0)
+#: Names of request headers whose values are a part of the response cache
+#: key. Responses varying on other headers are not cached.
+FEINCMS_RESPONSE_CACHE_VARY = getattr(settings, "FEINCMS_RESPONSE_CACHE_VARY", ())
+
+# ------------------------------------------------------------------------
+#: Record the durations of the stages of ``ContentObjectMixin.handler`` (the
+#: object lookup, request and response processors, content types and
+#: rendering) and send them using the ``feincms.signals.handler_timings``
+#: signal.
+FEINCMS_HANDLER_TIMINGS = getattr(settings, "FEINCMS_HANDLER_TIMINGS", False)
+#: Add the recorded durations to responses as ``Server-Timing`` header. Also
+#: records the durations if ``FEINCMS_HANDLER_TIMINGS`` is ``False``.
+FEINCMS_SERVER_TIMING_HEADER = getattr(settings, "FEINCMS_SERVER_TIMING_HEADER", False)
+
+# ------------------------------------------------------------------------
+#: Stream page responses: Everything before the first region (including the
+#: ``<head>``) is sent before rendering the regions, and each region rendered
+#: by ``feincms_render_region`` is sent as soon as it has been rendered.
+#: Only pages whose template has been registered with ``streaming=True`` are
+#: streamed, and pages with content types having ``process`` or ``finalize``
+#: methods are not. Can be overridden per view using the ``streaming``
+#: attribute.
+FEINCMS_STREAMING_RESPONSES = getattr(settings, "FEINCMS_STREAMING_RESPONSES", False)
+
 # ------------------------------------------------------------------------
 #: Filter languages available for front end users to this set. This allows
 #: to have languages not yet ready for prime time while being able to access
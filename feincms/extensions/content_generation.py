@@ -0,0 +1,123 @@
+"""
+Maintain a generation counter of the content of objects.
+
+The ``content_generation`` field is incremented whenever content blocks of
+the object are saved or deleted, be it through the item editor,
+``copy_content_from``, ``replace_content_with`` or any other code path
+saving or deleting content blocks one by one. The counter is bumped using a
+single ``UPDATE`` statement once the transaction has been committed, only
+once per object and transaction, and is never written back by ``save()``, so
+saving an object which has been loaded before its content changed does not
+reset the counter. Since descendants may inherit content, the counters of
+the descendants of MPTT objects (f.e. pages) are incremented as well, and
+moving an object increments the counters of the object and its
+descendants.
+
+Cache keys and ETags can use the counter to find out whether the content of
+an object has changed without loading its content blocks.
+"""
+
+from functools import partial
+
+from django.db import models
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from mptt.signals import node_moved
+
+from feincms import extensions
+from feincms.signals import content_changed
+from feincms.utils import on_commit_once
+
+
+# ------------------------------------------------------------------------
+class ContentGenerationField(models.PositiveIntegerField):
+    """
+    Counter which is only ever modified by ``content_changed_handler``;
+    updates through ``save()`` leave the stored value alone.
+    """
+
+    def pre_save(self, model_instance, add):
+        if add:
+            return super().pre_save(model_instance, add)
+        return F(self.attname)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        return name, "django.db.models.PositiveIntegerField", args, kwargs
+
+
+# ------------------------------------------------------------------------
+def bump_content_generation(model, pk, using="default"):
+    """
+    Increments the content generation of the object and of its descendants
+    """
+
+    queryset = model._base_manager.using(using).filter(pk=pk)
+    if hasattr(model, "_mptt_meta"):
+        opts = model._mptt_meta
+        node = queryset.values(
+            opts.tree_id_attr, opts.left_attr, opts.right_attr
+        ).first()
+        if node is None:
+            return
+        queryset = model._base_manager.using(using).filter(
+            **{
+                opts.tree_id_attr: node[opts.tree_id_attr],
+                "%s__gte" % opts.left_attr: node[opts.left_attr],
+                "%s__lte" % opts.right_attr: node[opts.right_attr],
+            }
+        )
+    queryset.update(content_generation=F("content_generation") + 1)
+
+
+def _bump_once(model, pk, using):
+    return on_commit_once(
+        ("content_generation", model._meta.label_lower, using, pk),
+        partial(bump_content_generation, model, pk, using),
+        using=using,
+    )
+
+
+def content_changed_handler(sender, instance, parent_deleted=False, **kwargs):
+    """
+    Increments the content generation of the parent of the saved or deleted
+    content block after the transaction has been committed.
+    """
+
+    if parent_deleted:
+        return
+
+    if not _bump_once(sender, instance.parent_id, instance._state.db):
+        return
+
+    # Keep the parent instance in sync if the content block references it
+    # already (e.g. inside ``copy_content_from``)
+    parent_field = instance._meta.get_field("parent")
+    if parent_field.is_cached(instance):
+        instance.parent.content_generation += 1
+
+
+def node_moved_handler(sender, instance, **kwargs):
+    """
+    Increments the content generation of the moved object and of its
+    descendants after the transaction has been committed, since they may
+    inherit content from other ancestors now.
+    """
+
+    _bump_once(sender, instance.pk, instance._state.db)
+
+
+# ------------------------------------------------------------------------
+class Extension(extensions.Extension):
+    def handle_model(self):
+        self.model.add_to_class(
+            "content_generation",
+            ContentGenerationField(_("content generation"), default=0, editable=False),
+        )
+
+        content_changed.connect(content_changed_handler, sender=self.model)
+        if hasattr(self.model, "_mptt_meta"):
+            node_moved.connect(node_moved_handler, sender=self.model)
+
+
+# ------------------------------------------------------------------------
@@ -0,0 +1,161 @@
+"""
+Maintain a denormalized index of all content blocks of a CMS base class.
+
+The index contains one row per content block with the parent, the region,
+the content type, the primary key and the ordering of the content block and
+is kept up to date when content blocks are saved or deleted. The content
+proxy uses the index to determine the content blocks of an object using a
+single indexed query and loads the content blocks of each content type using
+their primary keys.
+
+Content blocks which existed before the extension has been activated or
+which have been modified using ``QuerySet.update()`` can be indexed using
+``rebuild_content_index(Page)``.
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.utils.translation import gettext_lazy as _
+
+from feincms import extensions
+from feincms.models import ContentProxy
+from feincms.signals import content_changed
+
+
+# ------------------------------------------------------------------------
+class ContentIndexContentProxy(ContentProxy):
+    def _fetch_content_type_counts_for(self, pks, regions=None):
+        """
+        Determines the content type counts using the content index and
+        remembers the primary keys of all content blocks.
+        """
+
+        index = self.item._feincms_content_index
+        content_types = ContentType.objects.db_manager(self.db).get_for_models(
+            *self.item._feincms_content_types
+        )
+        ct_map = {
+            content_types[cls].id: idx
+            for idx, cls in enumerate(self.item._feincms_content_types)
+        }
+
+        queryset = index._default_manager.using(self.db).filter(parent__in=pks)
+        if regions:
+            queryset = queryset.filter(region__in=regions)
+
+        counts = {}
+        content_pks = self._cache.setdefault("content_pks", {})
+        for parent_id, region, ct_id, content_pk in queryset.order_by(
+            "ordering"
+        ).values_list("parent_id", "region", "content_type_id", "content_pk"):
+            if ct_id not in ct_map:
+                # The content type has been removed in the meantime
+                continue
+
+            count = (parent_id, ct_map[ct_id])
+            region_counts = counts.setdefault(parent_id, {}).setdefault(region, [])
+            if count not in region_counts:
+                region_counts.append(count)
+            content_pks.setdefault((region, *count), []).append(content_pk)
+
+        for parent_counts in counts.values():
+            for region_counts in parent_counts.values():
+                region_counts.sort(key=lambda count: count[1])
+
+        return counts
+
+
+# ------------------------------------------------------------------------
+def content_changed_handler(sender, instance, deleted, **kwargs):
+    """
+    Updates the content index entry of the saved or deleted content block.
+    """
+
+    using = instance._state.db
+    index = sender._feincms_content_index._default_manager.using(using)
+    content_type = ContentType.objects.db_manager(using).get_for_model(
+        instance.__class__
+    )
+
+    if deleted:
+        index.filter(content_type=content_type, content_pk=instance.pk).delete()
+    else:
+        index.update_or_create(
+            content_type=content_type,
+            content_pk=instance.pk,
+            defaults={
+                "parent_id": instance.parent_id,
+                "region": instance.region,
+                "ordering": instance.ordering,
+            },
+        )
+
+
+# ------------------------------------------------------------------------
+def rebuild_content_index(model, using="default", batch_size=1000):
+    """
+    Recreates the content index of the passed CMS base class from scratch.
+    """
+
+    index = model._feincms_content_index
+    with transaction.atomic(using=using):
+        index._default_manager.using(using).all().delete()
+
+        for cls in model._feincms_content_types:
+            content_type = ContentType.objects.db_manager(using).get_for_model(cls)
+            index._default_manager.using(using).bulk_create(
+                (
+                    index(
+                        parent_id=parent_id,
+                        region=region,
+                        content_type=content_type,
+                        content_pk=pk,
+                        ordering=ordering,
+                    )
+                    for pk, parent_id, region, ordering in cls._default_manager.using(
+                        using
+                    )
+                    .values_list("pk", "parent_id", "region", "ordering")
+                    .iterator()
+                ),
+                batch_size=batch_size,
+            )
+
+
+# ------------------------------------------------------------------------
+class Extension(extensions.Extension):
+    def handle_model(self):
+        cls = self.model
+
+        class Meta:
+            app_label = cls._meta.app_label
+            db_table = "%s_contentindex" % cls._meta.db_table
+            ordering = ["ordering"]
+            unique_together = [("content_type", "content_pk")]
+            indexes = [models.Index(fields=["parent", "region", "ordering"])]
+            verbose_name = _("content index entry")
+            verbose_name_plural = _("content index entries")
+
+        cls._feincms_content_index = type(
+            "%sContentIndex" % cls.__name__,
+            (models.Model,),
+            {
+                "__module__": cls.__module__,
+                "Meta": Meta,
+                "parent": models.ForeignKey(
+                    cls, related_name="+", on_delete=models.CASCADE
+                ),
+                "region": models.CharField(max_length=255),
+                "content_type": models.ForeignKey(
+                    ContentType, related_name="+", on_delete=models.CASCADE
+                ),
+                "content_pk": models.PositiveIntegerField(),
+                "ordering": models.IntegerField(default=0),
+            },
+        )
+        cls.content_proxy_class = ContentIndexContentProxy
+
+        content_changed.connect(content_changed_handler, sender=cls)
+
+
+# ------------------------------------------------------------------------
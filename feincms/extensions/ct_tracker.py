@@ -12,67 +12,125 @@
 """
 Track the content types for pages. Instead of gathering the content
 types present in each page at run time, save the current state at
-saving time, thus saving at least one DB query on page delivery.
+saving time (of the page or of its content blocks), thus saving at least
+one DB query on page delivery.
 """
 
 from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.query_utils import DeferredAttribute
 from django.db.models.signals import class_prepared, post_save, pre_save
 from django.utils.translation import gettext_lazy as _
+from mptt.signals import node_moved
 
-from feincms import extensions
+from feincms import extensions, settings
 from feincms.contrib.fields import JSONField
-from feincms.models import ContentProxy
-
-
-INVENTORY_VERSION = 1
+from feincms.models import ContentProxy, _ancestor_lists
+from feincms.signals import content_changed
+from feincms.utils import on_commit_once
+
+# Version 1 stored (parent pk, content type id) per region, version 2 stores
+# (parent pk, content type id, content block pk, ordering) per content block
+# sorted by ordering
+INVENTORY_VERSION = 2
 _translation_map_cache = {}
 
+#: Matches objects without inventory; JSONField stores empty values as ""
+MISSING_INVENTORY = Q(_ct_inventory__isnull=True) | Q(_ct_inventory="")
+
 
 # ------------------------------------------------------------------------
 class TrackerContentProxy(ContentProxy):
     def _fetch_content_type_counts(self):
         """
-        If an object with an empty _ct_inventory is encountered, compute all
-        the content types currently used on that object and save the list in
-        the object itself. Further requests for that object can then access
-        that information and find out which content types are used without
-        resorting to multiple selects on different ct tables.
-
-        It is therefore important that even an "empty" object does not have an
-        empty _ct_inventory.
+        Objects store the content types currently used on them in their
+        _ct_inventory, which is computed when the object or its content is
+        saved. Requests for that object can then access that information and
+        find out which content types are used without resorting to multiple
+        selects on different ct tables.
+
+        If an object without a valid _ct_inventory is encountered, the
+        content types are determined using the regular queries. The result
+        is only saved in the object if ``FEINCMS_CT_TRACKER_WRITE_ON_READ``
+        is set, so that rendering does not write to the database by default.
         """
 
         if "counts" not in self._cache:
-            if (
-                self.item._ct_inventory
-                and self.item._ct_inventory.get("_version_", -1) == INVENTORY_VERSION
-            ):
-                try:
-                    self._cache["counts"] = self._from_inventory(
-                        self.item._ct_inventory
-                    )
-                except KeyError:
-                    # It's possible that the inventory does not fit together
-                    # with the current models anymore, f.e. because a content
-                    # type has been removed.
-                    pass
+            self._fetch_cached_contents()
 
-            if "counts" not in self._cache:
+        if "counts" not in self._cache:
+            counts = self._stored_content_type_counts()
+            if counts is not None:
+                self._cache["counts"] = counts
+            else:
                 super()._fetch_content_type_counts()
 
-                self.item._ct_inventory = self._to_inventory(self._cache["counts"])
-
-                self.item.__class__.objects.filter(id=self.item.id).update(
-                    _ct_inventory=self.item._ct_inventory
-                )
-
-                # Run post save handler by hand
-                if hasattr(self.item, "get_descendants"):
-                    self.item.get_descendants(include_self=False).update(
-                        _ct_inventory=None
+                if settings.FEINCMS_CT_TRACKER_WRITE_ON_READ:
+                    try:
+                        self.item._ct_inventory = self._to_inventory(
+                            self._cache["counts"]
+                        )
+                    except KeyError:
+                        # The primary keys of the content blocks are unknown
+                        # (f.e. in single_query mode)
+                        return self._cache["counts"]
+
+                    self.item.__class__.objects.filter(id=self.item.id).update(
+                        _ct_inventory=self.item._ct_inventory
                     )
+
+                    # Run post save handler by hand
+                    if hasattr(self.item, "get_descendants"):
+                        self.item.get_descendants(include_self=False).update(
+                            _ct_inventory=None
+                        )
         return self._cache["counts"]
 
+    def _stored_content_type_counts(self):
+        """
+        Returns the counts stored in the _ct_inventory or ``None`` if the
+        object has no valid inventory.
+        """
+
+        inventory = self.item._ct_inventory
+        if not inventory or inventory.get("_version_", -1) not in (
+            1,
+            INVENTORY_VERSION,
+        ):
+            return None
+        try:
+            return self._from_inventory(inventory)
+        except KeyError:
+            # It's possible that the inventory does not fit together with the
+            # current models anymore, f.e. because a content type has been
+            # removed.
+            return None
+
+    def _fetch_content_type_counts_for(self, pks, regions=None):
+        """
+        Determines the content type counts by listing all content blocks,
+        remembering their primary keys and their ordering for the inventory.
+        """
+
+        return _counts_from_blocks(
+            _fetch_content_blocks(self.item.__class__, self.db, pks, regions=regions),
+            self._cache.setdefault("content_pks", {}),
+            self._cache.setdefault("content_orderings", {}),
+        )
+
+    def _compute_inventory(self):
+        """
+        Determines the content types used on the object (including inherited
+        regions) from scratch and returns the inventory.
+        """
+
+        if self.item.pk is None:
+            counts = {}
+        else:
+            counts = self._fetch_content_type_count_helper(self.item.pk)
+        return self._to_inventory(self._fetch_inherited_content_type_counts(counts))
+
     def _translation_map(self):
         cls = self.item.__class__
         if cls not in _translation_map_cache:
@@ -97,28 +155,224 @@ class TrackerContentProxy(ContentProxy):
     def _from_inventory(self, inventory):
         """
         Transforms the inventory from Django's content types to FeinCMS's
-        ContentProxy counts format.
+        ContentProxy counts format. Also remembers the order of the content
+        blocks, so that regions do not have to be sorted again if the loaded
+        content blocks still match the inventory.
+
+        The content blocks themselves are loaded by region and parent, so
+        that content blocks created without sending the model signals (f.e.
+        using ``bulk_create``) still show up as long as their content type
+        is listed in the inventory.
         """
 
         tmap = self._translation_map()
 
-        return {
-            region: [(pk, tmap[-ct]) for pk, ct in items]
-            for region, items in inventory.items()
-            if region != "_version_"
-        }
+        if inventory["_version_"] == 1:
+            return {
+                region: [(pk, tmap[-ct]) for pk, ct in items]
+                for region, items in inventory.items()
+                if region != "_version_"
+            }
+
+        counts = {}
+        content_order = {}
+        for region, blocks in inventory.items():
+            if region == "_version_":
+                continue
+
+            region_counts = counts[region] = []
+            region_order = content_order[region] = []
+            for parent_pk, ct, pk, ordering in blocks:
+                count = (parent_pk, tmap[-ct])
+                if count not in region_counts:
+                    region_counts.append(count)
+                region_order.append((count[1], pk, ordering))
+            region_counts.sort(key=lambda count: count[1])
+
+        self._cache.setdefault("content_order", {}).update(content_order)
+        return counts
 
     def _to_inventory(self, counts):
-        map = self._translation_map()
+        """
+        Transforms the counts into the inventory format. Requires the primary
+        keys and orderings of the content blocks determined by
+        ``_fetch_content_type_counts_for``.
+        """
 
-        inventory = {
-            region: [(pk, map[ct]) for pk, ct in items]
-            for region, items in counts.items()
-        }
+        map = self._translation_map()
+        content_pks = self._cache["content_pks"]
+        orderings = self._cache["content_orderings"]
+
+        inventory = {}
+        for region, items in counts.items():
+            inventory[region] = sorted(
+                (
+                    (parent_pk, map[ct], pk, orderings[(ct, pk)])
+                    for parent_pk, ct in items
+                    for pk in content_pks[(region, parent_pk, ct)]
+                ),
+                key=lambda block: block[3],
+            )
         inventory["_version_"] = INVENTORY_VERSION
         return inventory
 
 
+# ------------------------------------------------------------------------
+def _fetch_content_blocks(cls, using, pks, regions=None):
+    """
+    Returns ``(ct_idx, parent pk, region, pk, ordering)`` tuples for all
+    content blocks of the objects of the CMS base class ``cls`` with the
+    given primary keys using a single query.
+    """
+
+    pks = list(pks)
+    qn = connections[using].ops.quote_name
+    tmpl = [
+        "SELECT %d AS ct_idx, parent_id, region, %s, ordering FROM %s",
+        "WHERE parent_id IN (" + ",".join(["%%s"] * len(pks)) + ")",
+    ]
+    args = list(pks)
+
+    if regions:
+        tmpl.append("AND region IN (" + ",".join(["%%s"] * len(regions)) + ")")
+        args.extend(regions)
+
+    tmpl = " ".join(tmpl)
+
+    sql = " UNION ALL ".join(
+        [
+            tmpl % (idx, qn(ct._meta.pk.column), qn(ct._meta.db_table))
+            for idx, ct in enumerate(cls._feincms_content_types)
+        ]
+    )
+    sql = "SELECT * FROM ( " + sql + " ) AS ct ORDER BY ordering"
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, args * len(cls._feincms_content_types))
+        return cursor.fetchall()
+
+
+def _counts_from_blocks(blocks, content_pks, orderings):
+    """
+    Transforms the result of ``_fetch_content_blocks`` into content type
+    counts keyed by parent primary key and fills ``content_pks`` and
+    ``orderings``.
+    """
+
+    counts = {}
+    for ct_idx, parent_id, region, pk, ordering in blocks:
+        count = (parent_id, ct_idx)
+        region_counts = counts.setdefault(parent_id, {}).setdefault(region, [])
+        if count not in region_counts:
+            region_counts.append(count)
+        if (ct_idx, pk) not in orderings:
+            # Content blocks might be listed again, f.e. for ancestors
+            content_pks.setdefault((region, *count), []).append(pk)
+            orderings[(ct_idx, pk)] = ordering
+
+    for parent_counts in counts.values():
+        for region_counts in parent_counts.values():
+            region_counts.sort(key=lambda count: count[1])
+
+    return counts
+
+
+# ------------------------------------------------------------------------
+def rebuild_inventories(
+    model, pks=None, using="default", batch_size=500, progress=None
+):
+    """
+    Recomputes the _ct_inventory of all objects of ``model`` (or only of the
+    objects with the given primary keys) in batches. Each batch costs one
+    query to load the objects, at most one query to load ancestors which have
+    not been loaded yet, two queries to list the content blocks of the
+    objects and of their ancestors and one ``UPDATE`` statement.
+    ``progress`` is called with the number of processed objects after each
+    batch.
+    """
+
+    manager = model._base_manager.using(using)
+    if pks is None:
+        pks = list(manager.order_by("pk").values_list("pk", flat=True))
+    else:
+        pks = list(pks)
+
+    # The parents of the processed objects and of their ancestors are kept
+    # across batches
+    parents = {}
+
+    done = 0
+    for offset in range(0, len(pks), batch_size):
+        objects = list(manager.filter(pk__in=pks[offset : offset + batch_size]))
+        content_pks = {}
+        orderings = {}
+        counts = _counts_from_blocks(
+            _fetch_content_blocks(model, using, [obj.pk for obj in objects]),
+            content_pks,
+            orderings,
+        )
+
+        pending = []
+        for obj in objects:
+            proxy = TrackerContentProxy(obj)
+            proxy._cache["content_pks"] = content_pks
+            proxy._cache["content_orderings"] = orderings
+            obj_counts = dict(counts.get(obj.pk, {}))
+            pending.append(
+                [proxy, obj_counts, proxy._empty_inherited_regions(obj_counts)]
+            )
+
+        inheriting = [entry for entry in pending if entry[2]]
+        for entry, obj_ancestors in zip(
+            inheriting,
+            _ancestor_lists([entry[0] for entry in inheriting], parents),
+        ):
+            entry.append(obj_ancestors)
+        for entry in pending:
+            if not entry[2]:
+                entry.append([])
+
+        ancestor_pks = {pk for *_rest, obj_ancestors in pending for pk in obj_ancestors}
+        ancestor_counts = {}
+        if ancestor_pks:
+            ancestor_counts = _counts_from_blocks(
+                _fetch_content_blocks(
+                    model,
+                    using,
+                    ancestor_pks,
+                    regions=sorted(
+                        {
+                            region
+                            for _p, _c, regions, _a in pending
+                            for region in regions
+                        }
+                    ),
+                ),
+                content_pks,
+                orderings,
+            )
+
+        for proxy, obj_counts, empty_inherited_regions, obj_ancestors in pending:
+            for pk in obj_ancestors:
+                for region, region_counts in ancestor_counts.get(pk, {}).items():
+                    if region in empty_inherited_regions:
+                        obj_counts[region] = list(region_counts)
+                        empty_inherited_regions.discard(region)
+
+                if not empty_inherited_regions:
+                    break
+
+            proxy.item._ct_inventory = proxy._to_inventory(obj_counts)
+
+        manager.bulk_update(objects, ["_ct_inventory"], batch_size=batch_size)
+
+        done += len(objects)
+        if progress is not None:
+            progress(done)
+
+    return done
+
+
 # ------------------------------------------------------------------------
 def class_prepared_handler(sender, **kwargs):
     # It might happen under rare circumstances that not all model classes
@@ -132,21 +386,231 @@ class_prepared.connect(class_prepared_handler)
 
 
 # ------------------------------------------------------------------------
-def tree_post_save_handler(sender, instance, **kwargs):
+def clear_inheriting_descendants(instance, regions=None):
     """
-    Clobber the _ct_inventory attribute of this object and all sub-objects
-    on save.
+    Clobber the _ct_inventory attribute of all sub-objects whose template
+    inherits any of the passed regions (any region if ``regions`` is
+    ``None``). Sub-objects whose templates do not inherit those regions do
+    not depend on the content of this object and are left alone.
     """
     # TODO: Does not find everything it should when ContentProxy content
     # inheritance has been customized.
-    instance.get_descendants(include_self=True).update(_ct_inventory=None)
+
+    def inherits(template):
+        return any(
+            region.inherited and (regions is None or region.key in regions)
+            for region in template.regions
+        )
+
+    cls = instance.__class__
+    templates = getattr(cls, "_feincms_templates", None)
+    descendants = instance.get_descendants(include_self=False).exclude(
+        MISSING_INVENTORY
+    )
+
+    if templates is None:
+        # register_regions has been used
+        if not inherits(cls.template):
+            return
+    else:
+        other_keys = [
+            key for key, template in templates.items() if not inherits(template)
+        ]
+        if len(other_keys) == len(templates):
+            return
+        if other_keys:
+            descendants = descendants.exclude(template_key__in=other_keys)
+
+    descendants.update(_ct_inventory=None)
+
+
+def rebuild_moved_inventories(instance):
+    """
+    Recomputes the _ct_inventory of the sub-objects of a moved object which
+    may inherit content from its new ancestors, that is, sub-objects without
+    a valid inventory, with empty inherited regions or with inherited content
+    of objects outside of the moved subtree. The inventories of all other
+    sub-objects are left alone. Returns the primary keys of the updated
+    objects.
+    """
+
+    cls = instance.__class__
+    templates = getattr(cls, "_feincms_templates", None)
+    descendants = instance.get_descendants(include_self=False)
+    if templates is None:
+        # register_regions has been used
+        rows = [
+            (pk, cls.template, inventory)
+            for pk, inventory in descendants.values_list("pk", "_ct_inventory")
+        ]
+    else:
+        rows = [
+            (pk, templates.get(key), inventory)
+            for pk, key, inventory in descendants.values_list(
+                "pk", "template_key", "_ct_inventory"
+            )
+        ]
+
+    subtree = {instance.pk, *(pk for pk, _template, _inventory in rows)}
+
+    def outdated(template, inventory):
+        if template is None:
+            return False
+        regions = [region.key for region in template.regions if region.inherited]
+        if not regions:
+            return False
+        if not inventory or inventory.get("_version_", -1) not in (
+            1,
+            INVENTORY_VERSION,
+        ):
+            return True
+        return any(
+            not inventory.get(region)
+            or any(item[0] not in subtree for item in inventory[region])
+            for region in regions
+        )
+
+    pks = [pk for pk, template, inventory in rows if outdated(template, inventory)]
+    if pks:
+        rebuild_inventories(cls, pks=pks, using=instance._state.db)
+    return pks
+
+
+# ------------------------------------------------------------------------
+def tree_post_save_handler(sender, instance, created=False, **kwargs):
+    """
+    Clobber the _ct_inventory attribute of sub-objects inheriting content
+    when this object has been moved in the tree.
+    """
+
+    if created or getattr(instance, "_feincms_moving_subtree", False):
+        # New objects do not have sub-objects yet. Subtrees moved using
+        # ``move_subtree`` are updated by ``rebuild_moved_inventories``.
+        return
+
+    parent_attr = instance._mptt_meta.parent_attr
+    old_parent_id = getattr(instance, "_mptt_cached_fields", {}).get(
+        parent_attr, DeferredAttribute
+    )
+    if old_parent_id != instance._mptt_meta.get_raw_field_value(instance, parent_attr):
+        clear_inheriting_descendants(instance)
+
+
+# ------------------------------------------------------------------------
+def tree_node_moved_handler(sender, instance, **kwargs):
+    """
+    Clobber the _ct_inventory attribute of sub-objects inheriting content
+    when this object has been moved using ``move_to`` or ``move_node``.
+    """
+
+    if not getattr(instance, "_feincms_moving_subtree", False):
+        clear_inheriting_descendants(instance)
+
+
+# ------------------------------------------------------------------------
+def single_pre_save_handler(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Compute the _ct_inventory attribute of this object"""
+
+    if update_fields is not None and "_ct_inventory" not in update_fields:
+        # The inventory would not be saved anyway (f.e. when updating the
+        # URLs of subpages)
+        return
+
+    if raw or instance._state.adding:
+        # Loading fixtures, the content blocks might not exist yet. New
+        # objects do not have content blocks yet; their inventory is computed
+        # when their content changes.
+        instance._ct_inventory = None
+    else:
+        instance._ct_inventory = TrackerContentProxy(instance)._compute_inventory()
+
+
+# ------------------------------------------------------------------------
+def update_inventory(instance, old_inventory=None):
+    """
+    Recompute and save the _ct_inventory attribute of the object and clobber
+    the _ct_inventory attribute of all sub-objects inheriting regions whose
+    inventory has changed compared to ``old_inventory``.
+    """
+
+    instance._ct_inventory = TrackerContentProxy(instance)._compute_inventory()
+    instance.__class__._base_manager.using(instance._state.db).filter(
+        pk=instance.pk
+    ).update(_ct_inventory=instance._ct_inventory)
+
+    if not hasattr(instance, "get_descendants"):
+        return
+
+    if not old_inventory or old_inventory.get("_version_") != INVENTORY_VERSION:
+        # We do not know which regions have changed
+        clear_inheriting_descendants(instance)
+        return
+
+    regions = {
+        region
+        for region in set(old_inventory) | set(instance._ct_inventory)
+        if region != "_version_"
+        and [list(item) for item in old_inventory.get(region, ())]
+        != [list(item) for item in instance._ct_inventory.get(region, ())]
+    }
+    if regions:
+        clear_inheriting_descendants(instance, regions=regions)
+
+
+def _update_inventory_after_commit(model, pk, using, old_inventory):
+    instance = model._base_manager.using(using).filter(pk=pk).first()
+    if instance is not None:
+        update_inventory(instance, old_inventory)
 
 
 # ------------------------------------------------------------------------
-def single_pre_save_handler(sender, instance, **kwargs):
-    """Clobber the _ct_inventory attribute of this object"""
+def content_changed_handler(
+    sender, instance, raw=False, parent_deleted=False, **kwargs
+):
+    """
+    Recompute the _ct_inventory attribute of the object whose content block
+    has been saved or deleted and clobber the _ct_inventory attribute of all
+    sub-objects inheriting regions whose inventory has changed.
 
-    instance._ct_inventory = None
+    Inside transactions, the inventory is only clobbered when the first
+    content block of the object changes and recomputed once after the
+    transaction has been committed.
+    """
+
+    if parent_deleted:
+        return
+
+    # Do not leave an outdated inventory on the object in hand
+    if instance._meta.get_field("parent").is_cached(instance):
+        instance.parent._ct_inventory = None
+
+    using = instance._state.db
+    queryset = sender._base_manager.using(using).filter(pk=instance.parent_id)
+    if raw:
+        # Loading fixtures, the parent might not exist yet
+        queryset.update(_ct_inventory=None)
+        return
+
+    if not transaction.get_connection(using).in_atomic_block:
+        update_inventory(
+            instance.parent,
+            queryset.values_list("_ct_inventory", flat=True).first(),
+        )
+        return
+
+    state = {}
+    key = ("ct_tracker", sender._meta.label_lower, using, instance.parent_id)
+    if on_commit_once(
+        key,
+        lambda: _update_inventory_after_commit(
+            sender, instance.parent_id, using, state["old_inventory"]
+        ),
+        using=using,
+    ):
+        state["old_inventory"] = queryset.values_list(
+            "_ct_inventory", flat=True
+        ).first()
+        queryset.update(_ct_inventory=None)
 
 
 # ------------------------------------------------------------------------
@@ -159,8 +623,10 @@ class Extension(extensions.Extension):
         self.model.content_proxy_class = TrackerContentProxy
 
         pre_save.connect(single_pre_save_handler, sender=self.model)
+        content_changed.connect(content_changed_handler, sender=self.model)
         if hasattr(self.model, "get_descendants"):
             post_save.connect(tree_post_save_handler, sender=self.model)
+            node_moved.connect(tree_node_moved_handler, sender=self.model)
 
 
 # ------------------------------------------------------------------------
@@ -19,6 +19,7 @@ from django.utils.html import mark_safe
 from django.utils.translation import gettext_lazy as _
 
 from feincms import extensions
+from feincms.module.mixins import processor_options
 
 
 # ------------------------------------------------------------------------
@@ -63,6 +64,7 @@ def granular_now(n=None, default_tz=None):
 
 
 # ------------------------------------------------------------------------
+@processor_options(needs_content=False)
 def datepublisher_response_processor(page, request, response):
     """
     This response processor is automatically added when the datepublisher
@@ -0,0 +1,146 @@
+"""
+``rebuild_ct_inventories``
+--------------------------
+
+Recomputes the content type inventories of all models using the
+``feincms.extensions.ct_tracker`` extension, f.e. after migrations or content
+imports.
+"""
+
+import multiprocessing
+from time import perf_counter
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from feincms.extensions.ct_tracker import (
+    MISSING_INVENTORY,
+    TrackerContentProxy,
+    rebuild_inventories,
+)
+
+
+def _init_worker():
+    # Executed once per worker process, do not share the connections of the
+    # parent process
+    connections.close_all()
+
+
+def _rebuild_batch(args):
+    # Executed in worker processes
+    label, pks, using = args
+    return rebuild_inventories(
+        apps.get_model(label), pks=pks, using=using, batch_size=len(pks)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the content type inventories of models using the ct_tracker"
+        " extension."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            metavar="app_label.ModelName",
+            help="Models to process. Defaults to all models using ct_tracker.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of objects processed per batch (default: 500).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes (default: 1).",
+        )
+        parser.add_argument(
+            "--missing",
+            action="store_true",
+            help="Only process objects without an inventory.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database to use (default: %s)." % DEFAULT_DB_ALIAS,
+        )
+
+    def handle(self, **options):
+        if options["models"]:
+            try:
+                models = [apps.get_model(label) for label in options["models"]]
+            except (LookupError, ValueError) as e:
+                raise CommandError(e)
+        else:
+            models = [
+                model
+                for model in apps.get_models()
+                if issubclass(
+                    getattr(model, "content_proxy_class", object), TrackerContentProxy
+                )
+            ]
+
+        for model in models:
+            if not issubclass(
+                getattr(model, "content_proxy_class", object), TrackerContentProxy
+            ):
+                raise CommandError("%s does not use ct_tracker." % model._meta.label)
+            self.rebuild(model, **options)
+
+    def rebuild(self, model, batch_size, workers, missing, database, **options):
+        if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            raise CommandError("--workers requires the fork start method.")
+
+        start = perf_counter()
+        queryset = model._base_manager.using(database).order_by("pk")
+        if missing:
+            queryset = queryset.filter(MISSING_INVENTORY)
+        pks = list(queryset.values_list("pk", flat=True))
+        total = len(pks)
+
+        self.stdout.write(
+            "Rebuilding content type inventories of %d %s objects"
+            % (total, model._meta.label)
+        )
+
+        def progress(done):
+            elapsed = perf_counter() - start
+            self.stdout.write(
+                "%s: %d/%d objects (%.1fs, %.0f objects/s)"
+                % (model._meta.label, done, total, elapsed, done / (elapsed or 1))
+            )
+
+        if workers > 1 and total > batch_size:
+            # Hand out single batches to the workers and report the progress
+            # whenever any batch has been processed
+            batches = [
+                (model._meta.label, pks[i : i + batch_size], database)
+                for i in range(0, total, batch_size)
+            ]
+            connections.close_all()
+            # Forked workers inherit the configured Django project
+            with multiprocessing.get_context("fork").Pool(
+                workers, initializer=_init_worker
+            ) as pool:
+                done = 0
+                for count in pool.imap_unordered(_rebuild_batch, batches):
+                    done += count
+                    progress(done)
+        else:
+            rebuild_inventories(
+                model,
+                pks=pks,
+                using=database,
+                batch_size=batch_size,
+                progress=progress,
+            )
+
+        self.stdout.write(
+            "Done with %s in %.1fs" % (model._meta.label, perf_counter() - start)
+        )
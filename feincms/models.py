@@ -5,21 +5,30 @@ All models defined here are abstract, which means no tables are created in
 the feincms namespace.
 """
 
+import copy
 import operator
 import sys
+import threading
 import warnings
 from collections import OrderedDict
 from functools import reduce
+from itertools import groupby
 
+import django
+from asgiref.sync import sync_to_async
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ImproperlyConfigured
-from django.db import connections, models
+from django.db import connections, models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.forms.widgets import Media
 from django.utils.encoding import force_str
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 
+from feincms import settings
 from feincms.extensions import ExtensionsMixin
+from feincms.signals import content_changed
 from feincms.utils import ChoicesCharField, copy_model_instance
 
 
@@ -70,6 +79,7 @@ class Template:
         self.child_template = kwargs.get("child_template", None)
         self.enforce_leaf = kwargs.get("enforce_leaf", False)
         self.urlconf = kwargs.get("urlconf", None)
+        self.streaming = kwargs.get("streaming", False)
 
         def _make_region(data):
             if isinstance(data, Region):
@@ -83,6 +93,118 @@ class Template:
         return force_str(self.title)
 
 
+class ContentCache:
+    """
+    Process-local, size-bounded LRU cache of the content blocks loaded by
+    ``ContentProxy``. Entries are keyed by model, database, primary key,
+    content generation and language, so looking up an entry does not touch
+    the database; objects without a ``content_generation`` field (see
+    ``feincms.extensions.content_generation``) are not cached.
+
+    Entries are evicted when content blocks of the object or of an ancestor
+    the object inherited content from are saved or deleted, and when one of
+    those objects is saved or deleted itself. Other processes notice content
+    changes through the content generation which is a part of the key; the
+    extension also increments the content generation of the descendants of
+    objects whose content changed and of moved objects.
+
+    Cached content blocks are copied for each content proxy; related objects
+    loaded using ``select_related()`` are shared and should not be modified.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._models = set()
+        content_changed.connect(self._content_changed)
+
+    def key(self, item):
+        """
+        Returns the cache key for the passed object or ``None`` if the object
+        cannot be cached.
+        """
+
+        generation = getattr(item, "content_generation", None)
+        if item.pk is None or generation is None:
+            return None
+
+        return (
+            item._meta.concrete_model._meta.label_lower,
+            item._state.db,
+            item.pk,
+            generation,
+            get_language(),
+        )
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, model):
+        """
+        Stores an entry. ``entry["depends_on"]`` has to contain the primary
+        keys of all objects whose changes invalidate the entry.
+        """
+
+        model = model._meta.concrete_model
+        if model not in self._models:
+            self._models.add(model)
+            post_save.connect(self._item_changed, sender=model)
+            post_delete.connect(self._item_changed, sender=model)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, model, pk):
+        """
+        Evicts all entries depending on the object with the given primary key
+        """
+
+        label = model._meta.concrete_model._meta.label_lower
+        with self._lock:
+            for key in [
+                key
+                for key, entry in self._entries.items()
+                if key[0] == label and pk in entry["depends_on"]
+            ]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _content_changed(self, sender, instance, **kwargs):
+        self.invalidate(sender, instance.parent_id)
+
+    def _item_changed(self, sender, instance, **kwargs):
+        self.invalidate(sender, instance.pk)
+
+
+def _copy_instance(instance, exclude_parent=False):
+    """
+    Returns a shallow copy of a model instance which does not reference the
+    content proxy (and optionally the parent) of the original instance.
+    """
+
+    instance = copy.copy(instance)
+    instance.__dict__.pop("_content_proxy", None)
+    if exclude_parent:
+        parent_field = instance._meta.get_field("parent")
+        if parent_field.is_cached(instance):
+            parent_field.delete_cached_value(instance)
+    return instance
+
+
 class ContentProxy:
     """
     The ``ContentProxy`` is responsible for loading the content blocks for all
@@ -92,8 +214,39 @@ class ContentProxy:
     The content inside a region can be fetched using attribute access with
     the region key. This is achieved through a custom ``__getattr__``
     implementation.
+
+    By default, a count query determines which content types have to be
+    loaded at all, followed by one query per content type in use. If
+    ``single_query`` is set to ``True`` (f.e. in a subclass assigned to
+    ``content_proxy_class``), all content blocks are loaded using a single
+    ``UNION ALL`` query instead and the count query is skipped. Note that
+    ``get_queryset`` of content types is not used in this mode, which also
+    means that foreign keys are not loaded using ``select_related()``.
+
+    If ``lazy_regions`` is set to ``True``, accessing a region only loads the
+    content blocks of this region. This helps when rendering only a subset
+    of all regions (f.e. only the sidebar in a partial), but costs additional
+    queries when rendering all regions.
+
+    If ``content_cache`` is a ``ContentCache`` instance (the default if
+    ``FEINCMS_CONTENT_CACHE_SIZE`` is set), the content blocks of all regions
+    are kept in a process-local cache once they have been loaded, and later
+    content proxies for the same object do not touch the database at all.
     """
 
+    #: Load all content blocks of all types using a single query
+    single_query = False
+
+    #: Load content blocks region by region when accessing regions
+    lazy_regions = False
+
+    #: Process-local cache of loaded content blocks
+    content_cache = (
+        ContentCache(settings.FEINCMS_CONTENT_CACHE_SIZE)
+        if settings.FEINCMS_CONTENT_CACHE_SIZE
+        else None
+    )
+
     def __init__(self, item):
         item._needs_content_types()
         self.item = item
@@ -128,69 +281,307 @@ class ContentProxy:
             }
         """
 
+        if "counts" not in self._cache:
+            self._fetch_cached_contents()
+
+        if "counts" not in self._cache and self.single_query:
+            self._fetch_contents()
+
         if "counts" not in self._cache:
             counts = self._fetch_content_type_count_helper(self.item.pk)
+            self._cache["counts"] = self._fetch_inherited_content_type_counts(counts)
+            if not counts:
+                # Nothing else to load
+                self._store_in_content_cache()
+        return self._cache["counts"]
 
-            empty_inherited_regions = set()
-            for region in self.item.template.regions:
-                if region.inherited and not counts.get(region.key):
-                    empty_inherited_regions.add(region.key)
+    def _fetch_inherited_content_type_counts(self, counts):
+        """
+        Adds the counts of the nearest ancestor having content for all empty
+        inherited regions to the passed counts structure and returns it.
+        """
 
-            if empty_inherited_regions:
-                for parent in self._inherit_from():
-                    parent_counts = self._fetch_content_type_count_helper(
-                        parent, regions=tuple(empty_inherited_regions)
-                    )
+        _add_inherited_content_type_counts([(self, counts)])
+        return counts
 
-                    counts.update(parent_counts)
-                    for key in parent_counts.keys():
-                        empty_inherited_regions.discard(key)
+    def _empty_inherited_regions(self, regions):
+        """
+        Returns the keys of all inherited regions not contained in ``regions``
+        """
 
-                    if not empty_inherited_regions:
-                        break
+        return {
+            region.key
+            for region in self.item.template.regions
+            if region.inherited and not regions.get(region.key)
+        }
 
-            self._cache["counts"] = counts
-        return self._cache["counts"]
+    def _stored_content_type_counts(self):
+        """
+        Returns the content type counts (including inherited regions) stored
+        on the object itself, or ``None`` if they have to be determined using
+        the database. Used by ``prefetch_content``; ``TrackerContentProxy``
+        returns the counts of the ``_ct_inventory``.
+        """
+
+        return None
 
     def _fetch_content_type_count_helper(self, pk, regions=None):
-        tmpl = ["SELECT %d AS ct_idx, region, COUNT(id) FROM %s WHERE parent_id=%s"]
-        args = []
+        return self._fetch_content_type_counts_for([pk], regions=regions).get(pk, {})
 
-        if regions:
-            tmpl.append("AND region IN (" + ",".join(["%%s"] * len(regions)) + ")")
-            args.extend(regions * len(self.item._feincms_content_types))
+    def _fetch_content_type_counts_for(self, pks, regions=None):
+        """
+        Returns the content type counts for all objects with the given
+        primary keys as a dictionary keyed by primary key. Also used for the
+        ancestors when inheriting content and by ``prefetch_content``.
 
-        tmpl.append("GROUP BY region")
-        tmpl = " ".join(tmpl)
+        Subclasses may additionally fill ``self._cache["content_pks"]``, a
+        dictionary mapping ``(region, pk, ct_idx)`` to the primary keys of
+        the content blocks; those are then loaded using ``pk__in`` lookups.
+        """
 
-        sql = " UNION ".join(
-            [
-                tmpl % (idx, cls._meta.db_table, pk)
-                for idx, cls in enumerate(self.item._feincms_content_types)
-            ]
+        return _fetch_content_type_counts(
+            self.item.__class__, self.db, pks, regions=regions
         )
-        sql = "SELECT * FROM ( " + sql + " ) AS ct ORDER BY ct_idx"
 
-        _c = {}
-        with connections[self.db].cursor() as cursor:
-            cursor.execute(sql, args)
-            for ct_idx, region, count in cursor.fetchall():
-                if count:
-                    _c.setdefault(region, []).append((pk, ct_idx))
+    def _fetch_cached_contents(self):
+        """
+        Fills the counts and the content type caches from ``content_cache``
+        and returns ``True`` if an entry exists for the current object.
+        """
 
-        return _c
+        if self.content_cache is None or "content_cache_key" in self._cache:
+            return False
+
+        key = self._content_cache_lookup_key()
+        entry = key and self.content_cache.get(key)
+        if not entry:
+            return False
+
+        self._cache["content_cache_key"] = key
+        parents = {
+            pk: _copy_instance(parent) for pk, parent in entry["parents"].items()
+        }
+        parents[self.item.pk] = self.item
+        for parent in parents.values():
+            parent._content_proxy = self
+
+        cts = self._cache["cts"] = {}
+        for content in entry["contents"]:
+            content = _copy_instance(content)
+            content.parent = parents[content.parent_id]
+            cts.setdefault(content.__class__, {}).setdefault(content.region, []).append(
+                content
+            )
+
+        self._cache["counts"] = {
+            region: list(counts) for region, counts in entry["counts"].items()
+        }
+        return True
 
-    def _populate_content_type_caches(self, types):
+    def _content_cache_lookup_key(self):
+        # Computing the key may cost a query for the ancestors' generations
+        if "content_cache_lookup_key" not in self._cache:
+            self._cache["content_cache_lookup_key"] = self.content_cache.key(self.item)
+        return self._cache["content_cache_lookup_key"]
+
+    def _store_in_content_cache(self):
         """
-        Populate internal caches for all content types passed
+        Stores the content blocks of all regions in ``content_cache``. Must
+        only be called once the content blocks of all types and regions have
+        been loaded.
         """
 
-        counts_by_type = {}
-        for region, counts in self._fetch_content_type_counts().items():
-            for pk, ct_idx in counts:
-                counts_by_type.setdefault(
-                    self.item._feincms_content_types[ct_idx], []
-                ).append((region, pk))
+        if self.content_cache is None or "content_cache_key" in self._cache:
+            return
+
+        key = self._cache["content_cache_key"] = self._content_cache_lookup_key()
+        if key is None:
+            return
+
+        # Changes of ancestors the object inherits (or may inherit) content
+        # from evict the entry
+        ancestors = self._cache.get("ancestors")
+        if ancestors is None and any(
+            region.inherited for region in self.item.template.regions
+        ):
+            ancestors = list(self._inherit_from())
+
+        contents = []
+        parents = {}
+        for content_lists in self._cache["cts"].values():
+            for region_contents in content_lists.values():
+                for content in region_contents:
+                    if content.parent_id != self.item.pk:
+                        parents.setdefault(
+                            content.parent_id, _copy_instance(content.parent)
+                        )
+                    contents.append(_copy_instance(content, exclude_parent=True))
+
+        self.content_cache.set(
+            key,
+            {
+                "counts": {
+                    region: list(counts)
+                    for region, counts in self._cache["counts"].items()
+                },
+                "contents": contents,
+                "parents": parents,
+                "depends_on": {self.item.pk, *(ancestors or ())},
+            },
+            self.item.__class__,
+        )
+
+    def _fetch_contents(self):
+        """
+        Loads the content blocks of all types at once and fills the counts
+        and the content type caches (``single_query`` mode)
+        """
+
+        content_types = self.item._feincms_content_types
+        contents = self._fetch_contents_helper([self.item.pk])
+        for content in contents:
+            content.parent = self.item
+
+        regions = {}
+        for content in contents:
+            regions.setdefault(content.region, []).append(content)
+
+        empty_inherited_regions = self._empty_inherited_regions(regions)
+        ancestors = list(self._inherit_from()) if empty_inherited_regions else ()
+        if ancestors:
+            self._cache["ancestors"] = ancestors
+            ancestor_contents = {}
+            for content in self._fetch_contents_helper(
+                ancestors, regions=tuple(sorted(empty_inherited_regions))
+            ):
+                ancestor_contents.setdefault(
+                    (content.parent_id, content.region), []
+                ).append(content)
+
+            # Only keep the content blocks of the nearest ancestor per region
+            inherited = []
+            for pk in ancestors:
+                for region in list(empty_inherited_regions):
+                    if (pk, region) in ancestor_contents:
+                        inherited.extend(ancestor_contents[(pk, region)])
+                        empty_inherited_regions.discard(region)
+
+                if not empty_inherited_regions:
+                    break
+
+            if inherited:
+                parents = self.item.__class__._base_manager.using(self.db).in_bulk(
+                    {content.parent_id for content in inherited}
+                )
+                for content in inherited:
+                    content.parent = parents[content.parent_id]
+                contents.extend(inherited)
+
+        counts = {}
+        for content in contents:
+            self._cache["cts"].setdefault(content.__class__, {}).setdefault(
+                content.region, []
+            ).append(content)
+            count = (content.parent_id, content_types.index(content.__class__))
+            if count not in counts.setdefault(content.region, []):
+                counts[content.region].append(count)
+
+        for region_counts in counts.values():
+            region_counts.sort(key=lambda count: count[1])
+
+        self._cache["counts"] = counts
+
+        for content in contents:
+            setattr(content.parent, "_content_proxy", self)
+
+        self._store_in_content_cache()
+
+    def _fetch_contents_helper(self, pks, regions=None):
+        """
+        Returns the content blocks of all types belonging to the objects with
+        the given primary keys using a single ``UNION ALL`` query. Columns
+        shared by all content types come first, all other columns are padded
+        with ``NULL`` in the branches of the other content types. The padding
+        is cast to the type of the column, since databases such as PostgreSQL
+        do not match untyped ``NULL`` columns with other types.
+        """
+
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+
+        # Column 0 contains the content type index, the columns 1-4 are
+        # shared by all content types
+        common = ("pk", "parent", "region", "ordering")
+        width = 1 + len(common)
+        padding = ["NULL"] * width
+        layouts = []
+        for cls in self.item._feincms_content_types:
+            fields = cls._meta.concrete_fields
+            positions = []
+            for field in fields:
+                name = "pk" if field.primary_key else field.name
+                if name in common:
+                    positions.append(1 + common.index(name))
+                else:
+                    positions.append(width)
+                    width += 1
+                    db_type = field.cast_db_type(connection)
+                    padding.append("CAST(NULL AS %s)" % db_type if db_type else "NULL")
+
+            converters = []
+            for field in fields:
+                col = field.get_col(cls._meta.db_table)
+                converters.append(
+                    (
+                        col,
+                        connection.ops.get_db_converters(col)
+                        + col.get_db_converters(connection),
+                    )
+                )
+
+            layouts.append((cls, fields, positions, converters))
+
+        pks = list(pks)
+        where = "WHERE parent_id IN (" + ",".join(["%s"] * len(pks)) + ")"
+        if regions:
+            where += " AND region IN (" + ",".join(["%s"] * len(regions)) + ")"
+
+        branches = []
+        args = []
+        for idx, (cls, fields, positions, _converters) in enumerate(layouts):
+            select = ["%d" % idx] + padding[1:]
+            for field, position in zip(fields, positions):
+                select[position] = qn(field.column)
+            branches.append(
+                "SELECT %s FROM %s %s"
+                % (", ".join(select), qn(cls._meta.db_table), where)
+            )
+            args.extend(pks)
+            args.extend(regions or ())
+
+        with connection.cursor() as cursor:
+            cursor.execute(" UNION ALL ".join(branches), args)
+            rows = cursor.fetchall()
+
+        contents = []
+        for row in rows:
+            cls, fields, positions, converters = layouts[row[0]]
+            values = []
+            for position, (col, convs) in zip(positions, converters):
+                value = row[position]
+                for converter in convs:
+                    value = converter(value, col, connection)
+                values.append(value)
+            contents.append(
+                cls.from_db(self.db, [field.attname for field in fields], values)
+            )
+        return contents
+
+    def _populate_content_type_caches(self, types, regions=None):
+        """
+        Populate internal caches for all content types passed, optionally
+        only for the given regions
+        """
 
         # Resolve abstract to concrete content types
         if types is self.item._feincms_content_types:
@@ -198,33 +589,79 @@ class ContentProxy:
             # any type resolving
             content_types = self.item._feincms_content_types
         else:
-            content_types = (
-                cls
-                for cls in self.item._feincms_content_types
-                if issubclass(cls, tuple(types))
+            content_types = self._concrete_content_types(types)
+
+        _load_contents([self], content_types, regions=regions)
+
+    def _concrete_content_types(self, types):
+        """
+        Returns the concrete content types which are subclasses of any of the
+        passed types, in the order they have been created
+        """
+
+        index = self.item._feincms_content_types_by_base
+        if len(types) == 1:
+            return index.get(types[0], [])
+
+        concrete = set()
+        for type in types:
+            concrete.update(index.get(type, ()))
+        return [cls for cls in self.item._feincms_content_types if cls in concrete]
+
+    def _fetch_region(self, region):
+        """
+        Returns the content blocks of a single region, sorted by ordering.
+        Content blocks which have already been loaded (f.e. by
+        ``prefetch_content``) are reused, otherwise all regions are loaded
+        (or only this region if ``lazy_regions`` is set).
+        """
+
+        region_contents = self._cache.setdefault("region_contents", {})
+        if region not in region_contents:
+            content_types = self.item._feincms_content_types
+            cts = self._cache["cts"]
+            if any(
+                region not in cts.get(content_types[ct_idx], {})
+                for pk, ct_idx in self._fetch_content_type_counts().get(region, ())
+            ):
+                self._populate_content_type_caches(
+                    content_types, regions=(region,) if self.lazy_regions else None
+                )
+
+            contents = [
+                instance
+                for content_lists in cts.values()
+                for instance in content_lists.get(region, ())
+            ]
+            order = self._cache.get("content_order", {}).get(region)
+            ordered = order is not None and self._apply_content_order(contents, order)
+            region_contents[region] = ordered or sorted(
+                contents, key=lambda c: c.ordering
             )
 
-        for cls in content_types:
-            counts = counts_by_type.get(cls)
-            if cls not in self._cache["cts"]:
-                if counts:
-                    self._cache["cts"][cls] = list(
-                        cls.get_queryset().filter(
-                            reduce(
-                                operator.or_,
-                                (Q(region=r[0], parent=r[1]) for r in counts),
-                            )
-                        )
-                    )
-                else:
-                    self._cache["cts"][cls] = []
+        return region_contents[region]
 
-        # share this content proxy object between all content items
-        # so that each can use obj.parent.content to determine its
-        # relationship to its siblings, etc.
-        for objects in self._cache["cts"].values():
-            for obj in objects:
-                setattr(obj.parent, "_content_proxy", self)
+    def _apply_content_order(self, contents, order):
+        """
+        Returns the content blocks in the stored order, a list of
+        ``(content type index, pk, ordering)`` tuples (f.e. from the
+        ``ct_tracker`` inventory). Returns ``None`` if the content blocks do
+        not match the stored order anymore, f.e. because content blocks have
+        been added, removed or reordered without updating the inventory.
+        """
+
+        if len(contents) != len(order):
+            return None
+
+        index = {cls: idx for idx, cls in enumerate(self.item._feincms_content_types)}
+        by_key = {(index[c.__class__], c.pk): c for c in contents}
+        ordered = []
+        for ct_idx, pk, ordering in order:
+            content = by_key.get((ct_idx, pk))
+            if content is None or content.ordering != ordering:
+                return None
+            ordered.append(content)
+        return ordered
 
     def _fetch_regions(self):
         """
@@ -233,14 +670,9 @@ class ContentProxy:
 
         if "regions" not in self._cache:
             self._populate_content_type_caches(self.item._feincms_content_types)
-            contents = {}
-            for content_list in self._cache["cts"].values():
-                for instance in content_list:
-                    contents.setdefault(instance.region, []).append(instance)
-
             self._cache["regions"] = {
-                region: sorted(instances, key=lambda c: c.ordering)
-                for region, instances in contents.items()
+                region: self._fetch_region(region)
+                for region in self._fetch_content_type_counts()
             }
 
         return self._cache["regions"]
@@ -256,29 +688,110 @@ class ContentProxy:
         in different regions.
         """
 
-        content_list = []
         if not hasattr(type_or_tuple, "__iter__"):
             type_or_tuple = (type_or_tuple,)
-        self._populate_content_type_caches(type_or_tuple)
+        type_or_tuple = tuple(type_or_tuple)
+
+        # The results are cached per proxy, so that f.e. the content blocks
+        # having ``process`` and ``finalize`` methods are only determined once
+        all_of_type = self._cache.setdefault("all_of_type", {})
+        if type_or_tuple not in all_of_type:
+            content_types = self._concrete_content_types(type_or_tuple)
+            if content_types:
+                self._populate_content_type_caches(content_types)
+
+            cts = self._cache["cts"]
+            all_of_type[type_or_tuple] = sorted(
+                (
+                    content
+                    for cls in content_types
+                    for contents in cts.get(cls, {}).values()
+                    for content in contents
+                ),
+                key=lambda c: c.ordering,
+            )
+
+        return list(all_of_type[type_or_tuple])
 
-        for type, contents in self._cache["cts"].items():
-            if any(issubclass(type, t) for t in type_or_tuple):
-                content_list.extend(contents)
+    async def aload(self, regions=None):
+        """
+        Loads the content blocks of the passed regions (or of all regions)
+        for use in async code::
 
-        return sorted(content_list, key=lambda c: c.ordering)
+            await page.content.aload()
+            main = page.content.main  # Does not hit the database anymore
+
+        The content type counts (including inherited regions) are determined
+        using a single ``sync_to_async`` call, the content blocks themselves
+        are loaded using the async ORM.
+        """
+
+        if "counts" not in self._cache:
+            await sync_to_async(self._fetch_content_type_counts)()
+
+        await _aload_contents(
+            [self],
+            self.item._feincms_content_types,
+            regions=tuple(regions) if regions is not None else None,
+        )
+
+    async def aregion(self, region):
+        """
+        Async counterpart of accessing the region ``region`` as an attribute
+        """
+
+        if "counts" not in self._cache:
+            await sync_to_async(self._fetch_content_type_counts)()
+
+        if not self._cache["counts"].get(region):
+            return []
+
+        await self.aload(regions=(region,) if self.lazy_regions else None)
+        return self._fetch_region(region)
 
     def _get_media(self):
         """
         Collect the media files of all content types of the current object
+
+        Media files are merged in the order the content blocks appear on the
+        object. The merged media of consecutive content types whose media
+        does not depend on the instance is computed once per distinct
+        sequence of content types, only the media of the remaining content
+        blocks is merged for each object.
         """
 
         if "media" not in self._cache:
-            media = Media()
-
+            # (kind, content block) tuples, content types with class-level
+            # media are only listed on their first appearance
+            sequence = []
+            seen = set()
             for contents in self._fetch_regions().values():
                 for content in contents:
-                    if hasattr(content, "media"):
+                    cls = content.__class__
+                    kind = _content_media_kind(cls)
+                    if kind == "class":
+                        if cls in seen:
+                            continue
+                        seen.add(cls)
+                    if kind is not None:
+                        sequence.append((kind, content))
+
+            media = Media()
+            for kind, items in groupby(sequence, key=operator.itemgetter(0)):
+                blocks = [content for _kind, content in items]
+                if kind == "instance":
+                    for content in blocks:
                         media = media + content.media
+                    continue
+
+                key = tuple(content.__class__ for content in blocks)
+                class_media = _class_media_cache.get(key)
+                if class_media is None:
+                    class_media = Media()
+                    for content in blocks:
+                        class_media = class_media + content.media
+                    _class_media_cache[key] = class_media
+                media = media + class_media
 
             self._cache["media"] = media
         return self._cache["media"]
@@ -300,7 +813,416 @@ class ContentProxy:
         if not self._fetch_content_type_counts().get(attr):
             return []
 
-        return self._fetch_regions().get(attr, [])
+        return self._fetch_region(attr)
+
+
+#: Merged media per distinct sequence of content types with class-level media
+_class_media_cache = {}
+
+#: ``_content_media_kind`` results per content type
+_content_media_kinds = {}
+
+
+def _content_media_kind(cls):
+    """
+    Returns ``"class"`` if the media of the content type does not depend on
+    the instance (a ``Media`` class attribute or a property created by
+    ``django.forms.widgets.media_property``), ``"instance"`` if it may depend
+    on the instance and ``None`` if the content type has no media at all.
+    """
+
+    if cls not in _content_media_kinds:
+        kind = None
+        for klass in cls.__mro__:
+            attr = klass.__dict__.get("media")
+            if attr is None:
+                continue
+            if isinstance(attr, Media):
+                kind = kind or "class"
+                break
+            if isinstance(attr, property) and attr.fget.__qualname__.startswith(
+                "media_property."
+            ):
+                # Extends the media of the base classes
+                kind = "class"
+                continue
+            kind = "instance"
+            break
+        _content_media_kinds[cls] = kind
+    return _content_media_kinds[cls]
+
+
+def _fetch_content_type_counts(cls, using, pks, regions=None):
+    """
+    Returns the content type counts (in the format described in
+    ``ContentProxy._fetch_content_type_counts``) for all objects of the CMS
+    base class ``cls`` with the given primary keys using a single query. The
+    result is a dictionary keyed by primary key.
+    """
+
+    pks = list(pks)
+    tmpl = [
+        "SELECT %d AS ct_idx, parent_id, region, COUNT(id) FROM %s",
+        "WHERE parent_id IN (" + ",".join(["%%s"] * len(pks)) + ")",
+    ]
+    args = list(pks)
+
+    if regions:
+        tmpl.append("AND region IN (" + ",".join(["%%s"] * len(regions)) + ")")
+        args.extend(regions)
+
+    tmpl.append("GROUP BY parent_id, region")
+    tmpl = " ".join(tmpl)
+
+    sql = " UNION ".join(
+        [
+            tmpl % (idx, ct._meta.db_table)
+            for idx, ct in enumerate(cls._feincms_content_types)
+        ]
+    )
+    sql = "SELECT * FROM ( " + sql + " ) AS ct ORDER BY ct_idx"
+
+    _c = {}
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, args * len(cls._feincms_content_types))
+        for ct_idx, pk, region, count in cursor.fetchall():
+            if count:
+                _c.setdefault(pk, {}).setdefault(region, []).append((pk, ct_idx))
+
+    return _c
+
+
+def _add_parents(manager, objects, parents):
+    """
+    Adds the primary keys of the parents of the objects and of all their
+    ancestors to ``parents`` (a dictionary mapping primary keys to the
+    primary key of the parent). Ancestors which are not known yet are loaded
+    using a single query.
+    """
+
+    opts = manager.model._mptt_meta
+    attname = manager.model._meta.get_field(opts.parent_attr).attname
+    for obj in objects:
+        parents[obj.pk] = getattr(obj, attname)
+
+    missing = []
+    for obj in objects:
+        pk = parents[obj.pk]
+        while pk is not None and pk in parents:
+            pk = parents[pk]
+        if pk is not None:
+            missing.append(
+                Q(
+                    **{
+                        opts.tree_id_attr: getattr(obj, opts.tree_id_attr),
+                        "%s__lt" % opts.left_attr: getattr(obj, opts.left_attr),
+                        "%s__gt" % opts.right_attr: getattr(obj, opts.right_attr),
+                    }
+                )
+            )
+    if missing:
+        parents.update(
+            manager.filter(reduce(operator.or_, missing)).values_list(
+                "pk", opts.parent_attr
+            )
+        )
+
+
+def _ancestor_lists(proxies, parents=None):
+    """
+    Returns the lists of primary keys to try inheriting content from of all
+    passed proxies (see ``ContentProxy._inherit_from``). The proxies must
+    belong to objects of the same model. Unless ``_inherit_from`` has been
+    overridden, the ancestors of MPTT objects are determined using the
+    parents of the objects and of their ancestors, loading unknown ancestors
+    using a single query. ``parents`` may be passed to reuse known parents.
+    """
+
+    if not proxies:
+        return []
+
+    proxy = proxies[0]
+    model = proxy.item.__class__
+    if proxy.__class__._inherit_from is not ContentProxy._inherit_from or not hasattr(
+        model, "_mptt_meta"
+    ):
+        return [list(proxy._inherit_from()) for proxy in proxies]
+
+    if parents is None:
+        parents = {}
+    _add_parents(
+        model._base_manager.using(proxy.db),
+        [proxy.item for proxy in proxies],
+        parents,
+    )
+
+    ancestor_lists = []
+    for proxy in proxies:
+        ancestors = []
+        pk = parents.get(proxy.item.pk)
+        while pk is not None:
+            ancestors.append(pk)
+            pk = parents.get(pk)
+        ancestor_lists.append(ancestors)
+    return ancestor_lists
+
+
+def _add_inherited_content_type_counts(proxies_counts):
+    """
+    Fills the empty inherited regions of the passed ``(proxy, counts)`` pairs
+    with the counts of the nearest ancestor having content in the respective
+    region. The counts of all ancestors of all proxies are fetched using a
+    single query.
+    """
+
+    inheriting = []
+    for proxy, counts in proxies_counts:
+        empty_inherited_regions = proxy._empty_inherited_regions(counts)
+        if empty_inherited_regions:
+            inheriting.append((proxy, counts, empty_inherited_regions))
+
+    pending = []
+    for (proxy, counts, empty_inherited_regions), ancestors in zip(
+        inheriting, _ancestor_lists([proxy for proxy, _c, _r in inheriting])
+    ):
+        if ancestors:
+            proxy._cache["ancestors"] = ancestors
+            pending.append((counts, empty_inherited_regions, ancestors))
+
+    if not pending:
+        return
+
+    ancestor_counts = proxies_counts[0][0]._fetch_content_type_counts_for(
+        {pk for _counts, _regions, ancestors in pending for pk in ancestors},
+        regions=tuple(
+            sorted({region for _counts, regions, _a in pending for region in regions})
+        ),
+    )
+
+    for counts, empty_inherited_regions, ancestors in pending:
+        for pk in ancestors:
+            for region, region_counts in ancestor_counts.get(pk, {}).items():
+                if region in empty_inherited_regions:
+                    counts[region] = list(region_counts)
+                    empty_inherited_regions.discard(region)
+
+            if not empty_inherited_regions:
+                break
+
+
+def _load_contents(proxies, content_types, regions=None):
+    """
+    Loads all content blocks of the passed concrete content types which have
+    not been loaded yet into the caches of all passed content proxies. The
+    proxies must belong to objects of the same CMS base class. Runs at most
+    one query per content type, regardless of the number of proxies.
+    """
+
+    for queryset, targets in _pending_contents(proxies, content_types, regions):
+        for content in queryset:
+            _add_content(content, targets)
+
+    _contents_loaded(proxies, content_types, regions)
+
+
+async def _aload_contents(proxies, content_types, regions=None):
+    """
+    Async variant of ``_load_contents`` using the async ORM (or one
+    ``sync_to_async`` call per content type on Django < 4.1, where querysets
+    do not support ``async for`` yet). The content type counts of all
+    proxies have to be available already.
+    """
+
+    for queryset, targets in _pending_contents(proxies, content_types, regions):
+        if django.VERSION < (4, 1):
+            contents = await sync_to_async(list)(queryset)
+        else:
+            contents = [content async for content in queryset]
+        for content in contents:
+            _add_content(content, targets, load_parent=False)
+
+    _contents_loaded(proxies, content_types, regions)
+
+
+def _pending_contents(proxies, content_types, regions=None):
+    """
+    Returns a list of ``(queryset, targets)`` tuples for all content types
+    which still have to be loaded. ``targets`` maps ``(region, parent pk)``
+    to the lists of the content proxies' caches which should receive the
+    content blocks.
+    """
+
+    pending = {}
+    content_pks = {}
+    for proxy in proxies:
+        content_pks.update(proxy._cache.get("content_pks", {}))
+        all_content_types = proxy.item._feincms_content_types
+        for region, counts in proxy._fetch_content_type_counts().items():
+            if regions is not None and region not in regions:
+                continue
+
+            for pk, ct_idx in counts:
+                cls = all_content_types[ct_idx]
+                if cls not in content_types:
+                    continue
+
+                content_lists = proxy._cache["cts"].setdefault(cls, {})
+                if region in content_lists:
+                    continue
+
+                content_lists[region] = []
+                pending.setdefault(cls, {}).setdefault((region, pk), []).append(
+                    (proxy, content_lists[region])
+                )
+
+    querysets = []
+    for cls, targets in pending.items():
+        ct_idx = cls._feincms_content_class._feincms_content_types.index(cls)
+        pks = []
+        pks_by_region = {}
+        for region, pk in targets:
+            if (region, pk, ct_idx) in content_pks:
+                pks.extend(content_pks[(region, pk, ct_idx)])
+            else:
+                pks_by_region.setdefault(region, set()).add(pk)
+
+        filters = [
+            Q(region=region, parent__in=parent_pks)
+            for region, parent_pks in pks_by_region.items()
+        ]
+        if pks:
+            filters.append(Q(pk__in=pks))
+
+        querysets.append((cls.get_queryset(reduce(operator.or_, filters)), targets))
+    return querysets
+
+
+def _add_content(content, targets, load_parent=True):
+    """
+    Adds a loaded content block to the caches of the interested proxies
+    """
+
+    for proxy, content_list in targets.get((content.region, content.parent_id), ()):
+        content_list.append(content)
+
+        parent_field = content._meta.get_field("parent")
+        if not parent_field.is_cached(content):
+            if content.parent_id == proxy.item.pk:
+                content.parent = proxy.item
+            elif not load_parent:
+                continue
+
+        # share this content proxy object between all content items
+        # so that each can use obj.parent.content to determine its
+        # relationship to its siblings, etc.
+        setattr(content.parent, "_content_proxy", proxy)
+
+
+def _contents_loaded(proxies, content_types, regions=None):
+    if regions is None:
+        for proxy in proxies:
+            if content_types is proxy.item._feincms_content_types:
+                proxy._store_in_content_cache()
+
+
+def prefetch_content(objects, regions=None):
+    """
+    Loads the content blocks of all passed CMS objects at once, using one
+    query for the content type counts and one query per content type in use
+    instead of running those queries for each object separately::
+
+        pages = list(Page.objects.in_navigation())
+        prefetch_content(pages, regions=("main",))
+
+    If ``regions`` is given, only the content blocks of those regions are
+    loaded; the other regions are still loaded on demand. Since it accepts an
+    evaluated queryset as its single required argument, this function can be
+    passed to ``.transform()`` of querysets using
+    ``feincms.utils.queryset_transform.TransformQuerySet`` too.
+
+    Objects whose content type counts are stored on the object itself (f.e.
+    the ``_ct_inventory`` of the ``ct_tracker`` extension) do not need the
+    count query. The ancestors of other objects with empty inherited regions
+    are loaded using a single query too.
+    """
+
+    groups = {}
+    for obj in objects:
+        proxy = obj.content
+        key = (proxy.__class__, proxy.item.__class__, proxy.db)
+        groups.setdefault(key, {})[id(proxy)] = proxy
+
+    for (_proxy_class, cls, _using), proxies in groups.items():
+        proxies = list(proxies.values())
+        pending = []
+        for proxy in proxies:
+            if "counts" in proxy._cache or proxy._fetch_cached_contents():
+                continue
+            counts = proxy._stored_content_type_counts()
+            if counts is None:
+                pending.append(proxy)
+            else:
+                proxy._cache["counts"] = counts
+
+        if pending:
+            counts = pending[0]._fetch_content_type_counts_for(
+                [proxy.item.pk for proxy in pending]
+            )
+            proxies_counts = [
+                (proxy, counts.get(proxy.item.pk, {})) for proxy in pending
+            ]
+            _add_inherited_content_type_counts(proxies_counts)
+            for proxy, proxy_counts in proxies_counts:
+                proxy._cache["counts"] = proxy_counts
+
+        _load_contents(proxies, cls._feincms_content_types, regions=regions)
+
+
+_deleting = threading.local()
+
+
+def _deleting_objects():
+    if not hasattr(_deleting, "objects"):
+        _deleting.objects = set()
+    return _deleting.objects
+
+
+def _object_pre_delete_handler(sender, instance, **kwargs):
+    _deleting_objects().add(
+        (sender._meta.concrete_model, instance._state.db, instance.pk)
+    )
+
+
+def _object_post_delete_handler(sender, instance, **kwargs):
+    _deleting_objects().discard(
+        (sender._meta.concrete_model, instance._state.db, instance.pk)
+    )
+
+
+def _content_post_save_handler(sender, instance, raw=False, **kwargs):
+    content_changed.send(
+        sender=sender._feincms_content_class,
+        instance=instance,
+        deleted=False,
+        raw=raw,
+        parent_deleted=False,
+    )
+
+
+def _content_post_delete_handler(sender, instance, **kwargs):
+    cls = sender._feincms_content_class
+    content_changed.send(
+        sender=cls,
+        instance=instance,
+        deleted=True,
+        raw=False,
+        parent_deleted=(
+            cls._meta.concrete_model,
+            instance._state.db,
+            instance.parent_id,
+        )
+        in _deleting_objects(),
+    )
 
 
 def create_base_model(inherit_from=models.Model):
@@ -539,6 +1461,11 @@ def create_base_model(inherit_from=models.Model):
             # list of concrete content types
             cls._feincms_content_types = []
 
+            # concrete content types indexed by all their base classes (the
+            # abstract content types), used to resolve abstract content types
+            # without running issubclass checks
+            cls._feincms_content_types_by_base = {}
+
             # list of concrete content types having methods which may be called
             # before or after rendering the content:
             #
@@ -669,6 +1596,8 @@ def create_base_model(inherit_from=models.Model):
 
             new_type = type(str(class_name), (model, feincms_content_base), attrs)
             cls._feincms_content_types.append(new_type)
+            for base in new_type.__mro__:
+                cls._feincms_content_types_by_base.setdefault(base, []).append(new_type)
 
             if hasattr(getattr(new_type, "process", None), "__call__"):
                 cls._feincms_content_types_with_process.append(new_type)
@@ -696,6 +1625,24 @@ def create_base_model(inherit_from=models.Model):
             # Add a backlink from content-type to content holder class
             new_type._feincms_content_class = cls
 
+            # Send feincms.signals.content_changed when content blocks are
+            # saved or deleted
+            post_save.connect(_content_post_save_handler, sender=new_type)
+            post_delete.connect(_content_post_delete_handler, sender=new_type)
+
+            # Content blocks deleted together with their parent are flagged
+            # using parent_deleted in the content_changed signal
+            pre_delete.connect(
+                _object_pre_delete_handler,
+                sender=cls,
+                dispatch_uid="feincms-pre-delete-%s" % cls._meta.label_lower,
+            )
+            post_delete.connect(
+                _object_post_delete_handler,
+                sender=cls,
+                dispatch_uid="feincms-post-delete-%s" % cls._meta.label_lower,
+            )
+
             # Handle optgroup argument for grouping content types in the item
             # editor
             optgroup = kwargs.pop("optgroup", None)
@@ -746,10 +1693,9 @@ def create_base_model(inherit_from=models.Model):
             ):
                 return None
 
-            for type in cls._feincms_content_types:
-                if issubclass(type, model):
-                    if type.__base__ is model:
-                        return type
+            for type in cls._feincms_content_types_by_base.get(model, ()):
+                if type.__base__ is model:
+                    return type
             return None
 
         @classmethod
@@ -779,11 +1725,14 @@ def create_base_model(inherit_from=models.Model):
             try to copy content from another CMS base type.)
             """
 
-            for cls in self._feincms_content_types:
-                for content in cls.objects.filter(parent=obj):
-                    new = copy_model_instance(content, exclude=("id", "parent"))
-                    new.parent = self
-                    new.save()
+            # A single transaction, so that receivers of content_changed
+            # only have to update the object once
+            with transaction.atomic(using=self._state.db):
+                for cls in self._feincms_content_types:
+                    for content in cls.objects.filter(parent=obj):
+                        new = copy_model_instance(content, exclude=("id", "parent"))
+                        new.parent = self
+                        new.save()
 
         def replace_content_with(self, obj):
             """
@@ -793,9 +1742,10 @@ def create_base_model(inherit_from=models.Model):
             afterwards.
             """
 
-            for cls in self._feincms_content_types:
-                cls.objects.filter(parent=self).delete()
-            self.copy_content_from(obj)
+            with transaction.atomic(using=self._state.db):
+                for cls in self._feincms_content_types:
+                    cls.objects.filter(parent=self).delete()
+                self.copy_content_from(obj)
 
         @classmethod
         def register_with_reversion(cls, **kwargs):
@@ -1,6 +1,7 @@
 from collections import OrderedDict
+from time import perf_counter
 
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
 from django.template import Template
 from django.utils.decorators import method_decorator
 from django.views import generic
@@ -8,6 +9,119 @@ from django.views.generic.base import TemplateResponseMixin
 
 from feincms import settings
 from feincms.content.application.models import standalone
+from feincms.signals import handler_timings
+from feincms.utils.streaming import DeferredRegions
+from feincms.utils.timing import Timings, stage_name, timed, timings_for
+
+
+def processor_options(methods=None, needs_content=True):
+    """
+    Decorator declaring metadata of request and response processors:
+
+    * ``methods``: The processor is only run for requests using one of the
+      passed HTTP methods (f.e. ``("GET", "HEAD")``).
+    * ``needs_content``: Response processors declaring ``needs_content=False``
+      do not access the content of the object and are therefore also run for
+      responses served from the response cache of ``feincms.views.Handler``.
+    """
+
+    def decorator(fn):
+        fn.processor_methods = (
+            None if methods is None else frozenset(m.upper() for m in methods)
+        )
+        fn.processor_needs_content = needs_content
+        return fn
+
+    return decorator
+
+
+def compile_processors(processors, kind, method, reverse=False, cached=False):
+    """
+    Returns a tuple of ``(stage, fn)`` tuples of the processors which have to
+    be run for the request method, where ``stage`` is the name used for
+    timings. Only processors not needing content are returned if ``cached``
+    is true.
+    """
+    items = list(processors.items())
+    if reverse:
+        items.reverse()
+    return tuple(
+        (stage_name(kind, key), fn)
+        for key, fn in items
+        if method in (getattr(fn, "processor_methods", None) or (method,))
+        and not (cached and getattr(fn, "processor_needs_content", True))
+    )
+
+
+class ProcessorRegistry(OrderedDict):
+    """
+    Ordered dictionary of processors which caches the compiled processor
+    chains until it is modified.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._chains = {}
+        super().__init__(*args, **kwargs)
+
+    def chain(self, kind, method, reverse=False, cached=False):
+        key = (kind, method, reverse, cached)
+        try:
+            return self._chains[key]
+        except KeyError:
+            chain = self._chains[key] = compile_processors(
+                self, kind, method, reverse=reverse, cached=cached
+            )
+            return chain
+
+    def _invalidate(self):
+        self._chains.clear()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._invalidate()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._invalidate()
+
+    def clear(self):
+        super().clear()
+        self._invalidate()
+
+    def pop(self, *args):
+        try:
+            return super().pop(*args)
+        finally:
+            self._invalidate()
+
+    def popitem(self, last=True):
+        try:
+            return super().popitem(last=last)
+        finally:
+            self._invalidate()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in OrderedDict(*args, **kwargs).items():
+            self[key] = value
+
+    def move_to_end(self, key, last=True):
+        super().move_to_end(key, last=last)
+        self._invalidate()
+
+
+def processor_chain(processors, kind, method, reverse=False, cached=False):
+    """
+    Returns the compiled processor chain of a processor registry or of any
+    other mapping of processors.
+    """
+    if isinstance(processors, ProcessorRegistry):
+        return processors.chain(kind, method, reverse=reverse, cached=cached)
+    return compile_processors(processors, kind, method, reverse=reverse, cached=cached)
 
 
 class ContentModelMixin:
@@ -27,9 +141,11 @@ class ContentModelMixin:
         """
         Registers the passed callable as request processor. A request processor
         always receives two arguments, the current object and the request.
+        The chain of processors is compiled once and only recompiled when
+        processors are registered or removed, see ``processor_options``.
         """
         if cls.request_processors is None:
-            cls.request_processors = OrderedDict()
+            cls.request_processors = ProcessorRegistry()
         cls.request_processors[fn if key is None else key] = fn
 
     @classmethod
@@ -40,7 +156,7 @@ class ContentModelMixin:
         request and the response.
         """
         if cls.response_processors is None:
-            cls.response_processors = OrderedDict()
+            cls.response_processors = ProcessorRegistry()
         cls.response_processors[fn if key is None else key] = fn
 
     # TODO Implement admin_urlname templatetag protocol
@@ -76,19 +192,37 @@ class ContentObjectMixin(TemplateResponseMixin):
 
     context_object_name = None
 
+    #: Stream the rendered regions using a ``StreamingHttpResponse``,
+    #: defaults to ``FEINCMS_STREAMING_RESPONSES``.
+    streaming = None
+
     def handler(self, request, *args, **kwargs):
         if not hasattr(self.request, "_feincms_extra_context"):
             self.request._feincms_extra_context = {}
 
+        self.start_timings()
+        response = self.handle_object()
+        self.finish_timings(response)
+        return response
+
+    def handle_object(self):
         r = self.run_request_processors()
         if r:
             return r
 
+        with timed(self.request, "cache"):
+            r = self.get_cached_response()
+        if r:
+            return self.run_response_processors(r, cached=True) or r
+
         r = self.process_content_types()
         if r:
             return r
 
-        response = self.render_to_response(self.get_context_data())
+        if self.use_streaming():
+            response = self.render_to_streaming_response(self.get_context_data())
+        else:
+            response = self.render_to_response(self.get_context_data())
 
         r = self.finalize_content_types(response)
         if r:
@@ -98,8 +232,131 @@ class ContentObjectMixin(TemplateResponseMixin):
         if r:
             return r
 
+        self.cache_response(response)
         return response
 
+    def start_timings(self):
+        """
+        Starts collecting timings for the current request if enabled using
+        ``FEINCMS_HANDLER_TIMINGS`` or ``FEINCMS_SERVER_TIMING_HEADER``.
+        Does nothing if the timings have been started already (f.e. by
+        ``ContentView.dispatch`` to include the object lookup).
+        """
+        if timings_for(self.request) is None and (
+            settings.FEINCMS_HANDLER_TIMINGS or settings.FEINCMS_SERVER_TIMING_HEADER
+        ):
+            self.request._feincms_timings = Timings()
+
+    def finish_timings(self, response):
+        """
+        Sends the ``handler_timings`` signal and adds the ``Server-Timing``
+        header once the response has been rendered.
+        """
+        timings = timings_for(self.request)
+        if timings is None:
+            return
+        del self.request._feincms_timings
+
+        def finish(response, stage=None, started=None):
+            if stage is not None:
+                timings.add(stage, perf_counter() - started)
+            timings.add("total", perf_counter() - timings.started)
+            handler_timings.send(
+                sender=self.object.__class__,
+                instance=self.object,
+                request=self.request,
+                response=response,
+                timings=timings,
+            )
+            if settings.FEINCMS_SERVER_TIMING_HEADER and not response.streaming:
+                response["Server-Timing"] = timings.server_timing()
+
+        if hasattr(response, "render") and not response.is_rendered:
+            # Template responses are rendered after the handler returned;
+            # keep collecting the timings of the template tags until then.
+            self.request._feincms_timings = timings
+            render_started = perf_counter()
+
+            def finish_rendered(response):
+                del self.request._feincms_timings
+                finish(response, "render", render_started)
+
+            response.add_post_render_callback(finish_rendered)
+        elif response.streaming:
+            # Deferred regions are rendered while streaming, after the headers
+            # have been sent; the header only contains the stages until now.
+            if settings.FEINCMS_SERVER_TIMING_HEADER:
+                response["Server-Timing"] = timings.server_timing()
+            self.request._feincms_timings = timings
+            stream_started = perf_counter()
+
+            def stream(content):
+                try:
+                    yield from content
+                finally:
+                    self.request.__dict__.pop("_feincms_timings", None)
+                    finish(response, "stream", stream_started)
+
+            response.streaming_content = stream(response.streaming_content)
+        else:
+            finish(response)
+
+    def use_streaming(self):
+        """
+        Returns whether the response should be streamed. Only objects whose
+        template has been registered with ``streaming=True`` are streamed.
+        Pages containing content types with ``process`` or ``finalize``
+        methods (f.e. application contents, which may set headers or
+        short-circuit the response) are always rendered into memory.
+        """
+        streaming = (
+            settings.FEINCMS_STREAMING_RESPONSES
+            if self.streaming is None
+            else self.streaming
+        )
+        template = getattr(self.object, "template", None)
+        if not streaming or not getattr(template, "streaming", False):
+            return False
+        return not self.object.content.all_of_type(
+            tuple(self.object._feincms_content_types_with_process)
+            + tuple(self.object._feincms_content_types_with_finalize)
+        )
+
+    def render_to_streaming_response(self, context):
+        """
+        Renders the template without the regions and returns a
+        ``StreamingHttpResponse`` which renders and sends each region when
+        it is reached, see ``feincms.utils.streaming``.
+        """
+        template_response = self.render_to_response(context)
+        deferred = self.request._feincms_deferred_regions = DeferredRegions()
+        try:
+            with timed(self.request, "render"):
+                content = template_response.rendered_content
+        finally:
+            del self.request._feincms_deferred_regions
+
+        return StreamingHttpResponse(
+            deferred.stream(content),
+            status=template_response.status_code,
+            headers=dict(template_response.items()),
+        )
+
+    def get_cached_response(self):
+        """
+        Hook for returning a previously cached response after the request
+        processors have run. Does nothing by default, see
+        ``feincms.views.Handler``.
+        """
+        return None
+
+    def cache_response(self, response):
+        """
+        Hook for caching the response of a completely processed request.
+        Does nothing by default.
+        """
+        pass
+
     def get_template_names(self):
         # According to the documentation this method is supposed to return
         # a list. However, we can also return a Template instance...
@@ -138,25 +395,34 @@ class ContentObjectMixin(TemplateResponseMixin):
         also return a ``HttpResponse`` for shortcutting the rendering and
         returning that response immediately to the client.
         """
-        if not getattr(self.object, "request_processors", None):
+        processors = getattr(self.object, "request_processors", None)
+        if not processors:
             return
 
-        for fn in reversed(list(self.object.request_processors.values())):
-            r = fn(self.object, self.request)
+        for stage, fn in processor_chain(
+            processors, "request", self.request.method, reverse=True
+        ):
+            with timed(self.request, stage):
+                r = fn(self.object, self.request)
             if r:
                 return r
 
-    def run_response_processors(self, response):
+    def run_response_processors(self, response, cached=False):
         """
         After rendering an object to a response, the registered response
         processors are called to modify the response, eg. for setting cache or
-        expiration headers, keeping statistics, etc.
+        expiration headers, keeping statistics, etc. Only processors which do
+        not need the content of the object are run for cached responses.
         """
-        if not getattr(self.object, "response_processors", None):
+        processors = getattr(self.object, "response_processors", None)
+        if not processors:
             return
 
-        for fn in self.object.response_processors.values():
-            r = fn(self.object, self.request, response)
+        for stage, fn in processor_chain(
+            processors, "response", self.request.method, cached=cached
+        ):
+            with timed(self.request, stage):
+                r = fn(self.object, self.request, response)
             if r:
                 return r
 
@@ -174,7 +440,8 @@ class ContentObjectMixin(TemplateResponseMixin):
             tuple(self.object._feincms_content_types_with_process)
         ):
             try:
-                r = content.process(self.request, view=self)
+                with timed(self.request, stage_name("process", content)):
+                    r = content.process(self.request, view=self)
                 if r in (True, False):
                     successful = r
                 elif r:
@@ -210,7 +477,8 @@ class ContentObjectMixin(TemplateResponseMixin):
         for content in self.object.content.all_of_type(
             tuple(self.object._feincms_content_types_with_finalize)
         ):
-            r = content.finalize(self.request, response)
+            with timed(self.request, stage_name("finalize", content)):
+                r = content.finalize(self.request, response)
             if r:
                 return r
 
@@ -222,7 +490,9 @@ class ContentView(ContentObjectMixin, generic.DetailView):
         self.request = request
         self.args = args
         self.kwargs = kwargs
-        self.object = self.get_object()
+        self.start_timings()
+        with timed(request, "lookup"):
+            self.object = self.get_object()
         return self.handler(request, *args, **kwargs)
 
 
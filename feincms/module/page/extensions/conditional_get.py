@@ -0,0 +1,200 @@
+"""
+Answer conditional GET requests for pages without rendering them.
+
+The ETag of a page is computed from the content generation of the page and
+of the ancestors it inherits content from, the page generation (which
+changes whenever any page is saved, deleted or moved, see
+``feincms.module.page.routing``) and the language. If the
+changedate extension is active, the Last-Modified date is the latest
+modification date of the page and of those ancestors or the time of the
+last page change, whichever is later; saving or deleting content blocks
+updates the modification date of their page (once per transaction, after
+the transaction has been committed).
+
+Both validators are computed before any content block is loaded; only the
+content type counts are determined, since pages containing content types
+with a ``process`` method (f.e. application contents and forms) do not get
+any validators. Since the validators do not depend on the current user,
+responses which access the session or the CSRF token while rendering and
+streaming responses do not get any validators either. Requires the
+``content_generation`` extension.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from functools import partial
+
+from django.utils import timezone as django_timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.utils.translation import get_language
+
+from feincms import extensions
+from feincms.module.mixins import processor_options
+from feincms.module.page import routing
+from feincms.signals import content_changed
+from feincms.utils import on_commit_once, uses_cookies
+
+
+# ------------------------------------------------------------------------
+def _validators(page, request):
+    """
+    Returns the ETag and the Last-Modified date (as a POSIX timestamp) of the
+    page for the request; both are ``None`` if the page has to be rendered
+    every time.
+    """
+
+    cached = getattr(request, "_feincms_validators", None)
+    if cached is not None and cached[0] is page:
+        return cached[1]
+
+    validators = (None, None)
+    content_types = page._feincms_content_types
+    dynamic = tuple(page._feincms_content_types_with_process)
+    if not any(
+        issubclass(content_types[idx], dynamic)
+        for region_counts in page.content._fetch_content_type_counts().values()
+        for _pk, idx in region_counts
+    ):
+        queryset = page.__class__._base_manager.using(page._state.db)
+        if any(region.inherited for region in page.template.regions):
+            queryset = queryset.filter(
+                tree_id=page.tree_id, lft__lte=page.lft, rght__gte=page.rght
+            )
+        else:
+            queryset = queryset.filter(pk=page.pk)
+
+        has_dates = hasattr(page, "modification_date")
+        rows = list(
+            queryset.order_by("lft").values_list(
+                "content_generation", "modification_date" if has_dates else "pk"
+            )
+        )
+        parts = [
+            page.pk,
+            [generation for generation, _ in rows],
+            routing._current_generation(page.__class__, page._state.db),
+            getattr(page, "language", None),
+            get_language(),
+        ]
+        etag = hashlib.md5(repr(parts).encode()).hexdigest()
+
+        last_modified = None
+        if has_dates:
+            last_modified = max(
+                [int(date.timestamp()) for _, date in rows if date is not None]
+                + [routing.generation_timestamp(page.__class__, page._state.db)]
+            )
+        validators = (etag, last_modified)
+
+    request._feincms_validators = (page, validators)
+    return validators
+
+
+def etag(self, request):
+    return _validators(self, request)[0]
+
+
+def last_modified(self, request=None):
+    if request is None:
+        # Called by changedate.last_modified_response_processor
+        return self.modification_date
+    timestamp = _validators(self, request)[1]
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+# ------------------------------------------------------------------------
+@processor_options(methods=("GET", "HEAD"))
+def conditional_get_request_processor(page, request):
+    """
+    Returns a "304 Not Modified" response if the validators sent by the
+    client match.
+    """
+
+    if page.redirect_to:
+        return None
+
+    etag, last_modified = _validators(page, request)
+    if etag is None:
+        return None
+    return get_conditional_response(
+        request, etag=quote_etag(etag), last_modified=last_modified
+    )
+
+
+@processor_options(methods=("GET", "HEAD"))
+def conditional_get_response_processor(page, request, response):
+    """
+    Adds the ETag and Last-Modified headers to successful responses. Since
+    the validators do not depend on the current user, responses which
+    accessed the session or the CSRF token while rendering do not get any.
+    """
+
+    if response.status_code != 200 or response.streaming:
+        # Streamed regions are rendered after the headers have been sent
+        return
+
+    etag, last_modified = _validators(page, request)
+    if etag is None:
+        return
+
+    def add_headers(response):
+        if uses_cookies(request):
+            return
+        if not response.has_header("ETag"):
+            response["ETag"] = quote_etag(etag)
+        if last_modified is not None and not response.has_header("Last-Modified"):
+            response["Last-Modified"] = http_date(last_modified)
+
+    if hasattr(response, "render") and not response.is_rendered:
+        response.add_post_render_callback(add_headers)
+    else:
+        add_headers(response)
+
+
+# ------------------------------------------------------------------------
+def update_modification_date(model, pk, using="default"):
+    model._base_manager.using(using).filter(pk=pk).update(
+        modification_date=django_timezone.now()
+    )
+
+
+def content_changed_handler(sender, instance, parent_deleted=False, **kwargs):
+    """
+    Updates the modification date of the page whose content changed once
+    per transaction, after the transaction has been committed.
+    """
+
+    if parent_deleted:
+        return
+
+    using = instance._state.db
+    on_commit_once(
+        ("conditional_get", sender._meta.label_lower, using, instance.parent_id),
+        partial(update_modification_date, sender, instance.parent_id, using),
+        using=using,
+    )
+
+
+# ------------------------------------------------------------------------
+class Extension(extensions.Extension):
+    def handle_model(self):
+        # The page generation is part of the validators
+        self.model._feincms_page_generation_used = True
+        self.model.add_to_class("etag", etag)
+        self.model.add_to_class("last_modified", last_modified)
+
+        self.model.register_request_processor(
+            conditional_get_request_processor, key="conditional_get"
+        )
+        self.model.register_response_processor(
+            conditional_get_response_processor, key="conditional_get"
+        )
+
+        if hasattr(self.model, "modification_date"):
+            content_changed.connect(content_changed_handler, sender=self.model)
+
+
+# ------------------------------------------------------------------------
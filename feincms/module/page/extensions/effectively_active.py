@@ -0,0 +1,204 @@
+"""
+Maintain whether a page and all its ancestors are active.
+
+The ``_effectively_active`` field is updated when a page is saved or moved,
+including toggling the ``active`` flag in the tree editor, and is
+propagated to all descendants whose state changes. The field is added to
+the active filters, so ``Page.objects.active()`` (and therefore the page
+lookups and the sitemap) only returns pages whose ancestors are active too.
+``is_active()`` and ``are_ancestors_active()`` read the field instead of
+counting the active ancestors. Active filters other than the ``active`` flag
+(f.e. those of the datepublisher or sites extensions) still have to be
+checked for the ancestors using one query, but only if the field says that
+the page is active.
+
+Pages activated using ``QuerySet.update()`` are not noticed. Run
+``rebuild_effectively_active(Page)`` (f.e. in a data migration) after adding
+the field and after modifying pages using ``QuerySet.update()``, otherwise
+those pages are treated as inactive.
+"""
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, pre_save
+from django.utils.translation import gettext_lazy as _
+from mptt.signals import node_moved
+
+from feincms import extensions
+from feincms.module.page.models import BasePage
+
+
+# ------------------------------------------------------------------------
+def _has_other_active_filters(model):
+    return bool(
+        set(model._default_manager.active_filters or ())
+        - {"is_active", "effectively_active"}
+    )
+
+
+def _compute(instance):
+    """
+    Returns the stored and the computed ``_effectively_active`` values of
+    the page using a single query.
+    """
+
+    parent_id = instance.parent_id
+    stored = dict(
+        instance.__class__._base_manager.using(instance._state.db)
+        .filter(pk__in=[pk for pk in (instance.pk, parent_id) if pk is not None])
+        .values_list("pk", "_effectively_active")
+    )
+    computed = bool(instance.active) and (
+        parent_id is None or stored.get(parent_id, False)
+    )
+    return stored.get(instance.pk), computed
+
+
+def update_descendants(instance):
+    """
+    Updates the ``_effectively_active`` field of all descendants of the page
+    using at most three queries.
+    """
+
+    queryset = instance.get_descendants()
+    if not instance._effectively_active:
+        queryset.filter(_effectively_active=True).update(_effectively_active=False)
+        return
+
+    # Descendants are effectively active unless they are inside the subtree
+    # of an inactive descendant
+    inactive = Q()
+    right = 0
+    for lft, rght in queryset.filter(active=False).values_list("lft", "rght"):
+        if lft > right:
+            inactive |= Q(lft__gte=lft, rght__lte=rght)
+            right = rght
+
+    if inactive:
+        queryset.filter(inactive, _effectively_active=True).update(
+            _effectively_active=False
+        )
+        queryset = queryset.exclude(inactive)
+    queryset.filter(_effectively_active=False).update(_effectively_active=True)
+
+
+def rebuild_effectively_active(model, using="default", batch_size=500):
+    """
+    Recomputes the ``_effectively_active`` field of all pages from scratch.
+    """
+
+    active = set()
+    for pk, parent_id, is_active in (
+        model._base_manager.using(using)
+        .order_by("tree_id", "lft")
+        .values_list("pk", "parent_id", "active")
+    ):
+        # Ancestors come first in tree order
+        if is_active and (parent_id is None or parent_id in active):
+            active.add(pk)
+
+    queryset = model._base_manager.using(using)
+    active = sorted(active)
+    with transaction.atomic(using=using):
+        queryset.update(_effectively_active=False)
+        for start in range(0, len(active), batch_size):
+            queryset.filter(pk__in=active[start : start + batch_size]).update(
+                _effectively_active=True
+            )
+
+
+# ------------------------------------------------------------------------
+def pre_save_handler(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Compute the _effectively_active attribute of this page"""
+
+    if raw or (
+        update_fields is not None and "_effectively_active" not in update_fields
+    ):
+        # Loading fixtures, the parent might not exist yet. Or the field
+        # would not be saved anyway.
+        instance._effectively_active_changed = False
+        return
+
+    stored, instance._effectively_active = _compute(instance)
+    instance._effectively_active_changed = (
+        stored is not None and stored != instance._effectively_active
+    )
+
+
+def post_save_handler(sender, instance, **kwargs):
+    """Propagate changes of the _effectively_active attribute"""
+
+    if getattr(instance, "_effectively_active_changed", False):
+        instance._effectively_active_changed = False
+        update_descendants(instance)
+
+
+def node_moved_handler(sender, instance, **kwargs):
+    """
+    Update the _effectively_active attribute of pages moved using
+    ``move_to`` or ``move_node``.
+    """
+
+    stored, instance._effectively_active = _compute(instance)
+    if stored != instance._effectively_active:
+        sender._base_manager.using(instance._state.db).filter(pk=instance.pk).update(
+            _effectively_active=instance._effectively_active
+        )
+        update_descendants(instance)
+
+
+# ------------------------------------------------------------------------
+def is_active(self):
+    """
+    Check whether this page and all its ancestors are active
+    """
+
+    if not self.pk or not self.active or not self._effectively_active:
+        return False
+    if _has_other_active_filters(self.__class__):
+        return BasePage.is_active(self)
+    return True
+
+
+is_active.short_description = _("is active")
+
+
+def are_ancestors_active(self):
+    """
+    Check whether all ancestors of this page are active
+    """
+
+    if self.is_root_node():
+        return True
+    if self.active and not self._effectively_active:
+        # At least one ancestor is inactive in this case
+        return False
+    if self.active and not _has_other_active_filters(self.__class__):
+        # All ancestors are active in this case
+        return True
+    return BasePage.are_ancestors_active(self)
+
+
+# ------------------------------------------------------------------------
+class Extension(extensions.Extension):
+    def handle_model(self):
+        self.model.add_to_class(
+            "_effectively_active",
+            models.BooleanField(
+                _("effectively active"), default=False, editable=False, db_index=True
+            ),
+        )
+        self.model.add_to_class("is_active", is_active)
+        self.model.add_to_class("are_ancestors_active", are_ancestors_active)
+
+        if hasattr(self.model._default_manager, "add_to_active_filters"):
+            self.model._default_manager.add_to_active_filters(
+                Q(_effectively_active=True), key="effectively_active"
+            )
+
+        pre_save.connect(pre_save_handler, sender=self.model)
+        post_save.connect(post_save_handler, sender=self.model)
+        node_moved.connect(node_moved_handler, sender=self.model)
+
+
+# ------------------------------------------------------------------------
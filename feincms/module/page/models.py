@@ -2,18 +2,20 @@
 # ------------------------------------------------------------------------
 
 
+from django.apps import apps
 from django.core.exceptions import PermissionDenied
 from django.db import models, transaction
-from django.db.models import Q
+from django.db.models import Q, signals
 from django.http import Http404
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from mptt.models import MPTTModel, TreeManager
+from mptt.signals import node_moved
 
 from feincms import settings
 from feincms.models import create_base_model
 from feincms.module.mixins import ContentModelMixin
-from feincms.module.page import processors
+from feincms.module.page import processors, routing
 from feincms.utils import get_model_instance, match_model_string, shorten_string
 from feincms.utils.managers import ActiveAwareContentManagerMixin
 
@@ -38,19 +40,14 @@ class BasePageManager(ActiveAwareContentManagerMixin, TreeManager):
         """
 
         stripped = path.strip("/")
+        url = "/%s/" % stripped if stripped else "/"
 
-        try:
-            page = self.active().get(_cached_url="/%s/" % stripped if stripped else "/")
-
-            if not page.are_ancestors_active():
-                raise self.model.DoesNotExist("Parents are inactive.")
-
-            return page
-
-        except self.model.DoesNotExist:
+        page = self._lookup("page_for_path", url, lambda: self._page_for_url(url))
+        if page is None:
             if raise404:
                 raise Http404()
-            raise
+            raise self.model.DoesNotExist
+        return page
 
     def best_match_for_path(self, path, raise404=False):
         """
@@ -71,24 +68,108 @@ class BasePageManager(ActiveAwareContentManagerMixin, TreeManager):
             tokens = path.split("/")
             paths += ["/%s/" % "/".join(tokens[:i]) for i in range(1, len(tokens) + 1)]
 
+        page = self._lookup(
+            "best_match_for_path", paths[-1], lambda: self._best_match_for_urls(paths)
+        )
+        if page is None:
+            if raise404:
+                raise Http404()
+            raise self.model.DoesNotExist
+        return page
+
+    def _lookup(self, kind, url, lookup):
+        """
+        Return the result of ``lookup()``, or ``None`` without calling it if
+        the negative lookup cache knows that ``url`` does not match any page.
+        """
+
+        negative_cache = routing.negative_lookup_cache()
+        if negative_cache is None:
+            return lookup()
+
+        key = negative_cache.key(self, kind, url)
+        if key in negative_cache:
+            return None
+        page = lookup()
+        if page is None:
+            negative_cache.add(key)
+        return page
+
+    def _page_for_url(self, url):
+        if settings.FEINCMS_PAGE_ROUTING_TABLE:
+            return self._page_from_routing_table([url])
+
+        try:
+            page = self.active().get(_cached_url=url)
+        except self.model.DoesNotExist:
+            return None
+        return page if page.are_ancestors_active() else None
+
+    def _best_match_for_urls(self, urls):
+        if settings.FEINCMS_PAGE_ROUTING_TABLE:
+            return self._page_from_routing_table(reversed(urls))
+
         try:
             page = (
                 self.active()
-                .filter(_cached_url__in=paths)
+                .filter(_cached_url__in=urls)
                 .extra(select={"_url_length": "LENGTH(_cached_url)"})
                 .order_by("-_url_length")[0]
             )
+        except IndexError:
+            return None
+        return page if page.are_ancestors_active() else None
+
+    def _page_from_routing_table(self, paths):
+        """
+        Return the page of the first path found in the routing table, or
+        ``None`` if no path matches.
+        """
+
+        table = routing.routing_table(self)
+        for path in paths:
+            if path in table:
+                if table[path] is None:
+                    # The page is not reachable, its ancestors are inactive
+                    return None
+                try:
+                    return self.active().get(pk=table[path])
+                except self.model.DoesNotExist:
+                    # The page has become inactive since the table has been
+                    # built, f.e. because its publication end date passed
+                    return None
+        return None
+
+    def move_subtree(self, page, target, position="last-child"):
+        """
+        Move ``page`` and its descendants relative to ``target``. Only the
+        moved page itself is saved; the URLs of its descendants are updated
+        like when saving a page, see ``FEINCMS_PAGE_URL_CASCADE_SIGNALS``.
+        If the ``ct_tracker`` extension is active, only the inventories of
+        descendants which may inherit content from the new ancestors are
+        recomputed, in bulk. Returns the primary keys of all moved pages, f.e.
+        for invalidating caches.
 
-            if not page.are_ancestors_active():
-                raise IndexError("Parents are inactive.")
+        Raises ``mptt.exceptions.InvalidMove`` if the move is not allowed.
+        """
 
-            return page
+        with transaction.atomic(using=self.db):
+            # move_node() saves the page, which updates the URLs of the page
+            # (sending the regular signals) and of its descendants
+            page._feincms_moving_subtree = True
+            try:
+                self.move_node(page, target, position)
+            finally:
+                del page._feincms_moving_subtree
 
-        except IndexError:
-            if raise404:
-                raise Http404()
+            if hasattr(self.model, "_ct_inventory"):
+                from feincms.extensions.ct_tracker import rebuild_moved_inventories
+
+                rebuild_moved_inventories(page)
 
-        raise self.model.DoesNotExist
+            pks = [page.pk, *page.get_descendants().values_list("pk", flat=True)]
+
+        return pks
 
     def in_navigation(self):
         """
@@ -271,23 +352,73 @@ class BasePage(create_base_model(MPTTModel), ContentModelMixin):
             # on large sites we'll check whether our _cached_url actually changed
             # or if the updates weren't navigation related:
             if self._cached_url != self._original_cached_url:
-                pages = self.get_descendants().order_by("lft")
-
-                for page in pages:
-                    if page.override_url:
-                        page._cached_url = page.override_url
-                    else:
-                        # cannot be root node by definition
-                        page._cached_url = "{}{}/".format(
-                            cached_page_urls[page.parent_id],
-                            page.slug,
-                        )
-
-                    cached_page_urls[page.id] = page._cached_url
-                    super(BasePage, page).save()  # do not recurse
+                self._update_descendant_urls(cached_page_urls)
+                self._original_cached_url = self._cached_url
 
     save.alters_data = True
 
+    def _update_descendant_urls(self, cached_page_urls, batch_size=500):
+        """
+        Updates the ``_cached_url`` attribute of all subpages using bulk
+        updates. Subpages whose URL did not change (f.e. because they or one
+        of their ancestors have an ``override_url``) are skipped.
+        ``pre_save`` and ``post_save`` are sent for every updated subpage
+        with ``update_fields={"_cached_url"}`` unless
+        ``FEINCMS_PAGE_URL_CASCADE_SIGNALS`` is ``False``.
+        """
+
+        send_signals = settings.FEINCMS_PAGE_URL_CASCADE_SIGNALS
+        pages = self.get_descendants().order_by("lft")
+        if not send_signals:
+            pages = pages.only("parent", "slug", "override_url", "_cached_url")
+
+        changed = []
+        for page in pages:
+            if page.override_url:
+                page._cached_url = page.override_url
+            else:
+                # cannot be root node by definition
+                page._cached_url = "{}{}/".format(
+                    cached_page_urls[page.parent_id],
+                    page.slug,
+                )
+
+            cached_page_urls[page.id] = page._cached_url
+            if page._cached_url != page._original_cached_url:
+                changed.append(page)
+
+        using = self._state.db
+        update_fields = frozenset(["_cached_url"])
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start : start + batch_size]
+            if send_signals:
+                for page in batch:
+                    signals.pre_save.send(
+                        sender=page.__class__,
+                        instance=page,
+                        raw=False,
+                        using=using,
+                        update_fields=update_fields,
+                    )
+            self.__class__._base_manager.using(using).bulk_update(batch, update_fields)
+            for page in batch:
+                page._original_cached_url = page._cached_url
+                if send_signals:
+                    # The page generation has been changed when saving or
+                    # moving this page already, see page_changed_handler
+                    page._updating_descendant_url = True
+                    try:
+                        signals.post_save.send(
+                            sender=page.__class__,
+                            instance=page,
+                            created=False,
+                            raw=False,
+                            using=using,
+                            update_fields=update_fields,
+                        )
+                    finally:
+                        del page._updating_descendant_url
+
     def delete(self, *args, **kwargs):
         if not settings.FEINCMS_SINGLETON_TEMPLATE_DELETION_ALLOWED:
             if self.template.singleton:
@@ -348,12 +479,19 @@ class BasePage(create_base_model(MPTTModel), ContentModelMixin):
         if not self.redirect_to:
             return None
 
+        # Resolved before, f.e. by prefetch_redirect_targets
+        cached = getattr(self, "_redirect_to_page_cache", None)
+        if cached is not None and cached[0] == self.redirect_to:
+            return cached[1]
+
         # It might be an identifier for a different object
         whereto = match_model_string(self.redirect_to)
         if not whereto:
             return None
 
-        return get_model_instance(*whereto)
+        target = get_model_instance(*whereto)
+        self._redirect_to_page_cache = (self.redirect_to, target)
+        return target
 
     def get_redirect_to_target(self, request=None):
         """
@@ -380,6 +518,71 @@ class BasePage(create_base_model(MPTTModel), ContentModelMixin):
         )
 
 
+# ------------------------------------------------------------------------
+def prefetch_redirect_targets(pages):
+    """
+    Resolves the ``app_label.model_name:pk`` redirect targets of all passed
+    pages using one query per target model instead of one query per page
+    and caches them on the pages for ``get_redirect_to_page``::
+
+        pages = list(Page.objects.in_navigation())
+        prefetch_redirect_targets(pages)
+
+    Other objects (f.e. ``PagePretender`` instances) are skipped, so the
+    result of ``feincms_nav`` can be passed too.
+    """
+
+    targets = {}
+    for page in pages:
+        if not isinstance(page, BasePage) or not page.redirect_to:
+            continue
+        cached = getattr(page, "_redirect_to_page_cache", None)
+        if cached is not None and cached[0] == page.redirect_to:
+            continue
+        whereto = match_model_string(page.redirect_to)
+        if whereto:
+            app_label, model_name, pk = whereto
+            targets.setdefault((app_label, model_name), {}).setdefault(pk, []).append(
+                page
+            )
+
+    for (app_label, model_name), pages_by_pk in targets.items():
+        model = apps.get_model(app_label, model_name)
+        instances = model._default_manager.in_bulk(list(pages_by_pk))
+        for pk, target_pages in pages_by_pk.items():
+            for page in target_pages:
+                page._redirect_to_page_cache = (page.redirect_to, instances.get(pk))
+
+
+# ------------------------------------------------------------------------
+def page_changed_handler(sender, instance, **kwargs):
+    """
+    Changes the page generation used by the routing table, the negative
+    lookup cache, the response cache and the conditional_get extension when
+    a page has been saved, deleted or moved. Subpages whose URL is updated
+    because an ancestor has been saved or moved are skipped, the generation
+    has been changed for the ancestor already.
+    """
+
+    if getattr(instance, "_updating_descendant_url", False):
+        return
+    if routing.page_generation_used(sender):
+        routing.invalidate_routing_table(sender, using=instance._state.db)
+
+
+def page_class_prepared_handler(sender, **kwargs):
+    if issubclass(sender, BasePage) and not sender._meta.abstract:
+        uid = "feincms-page-changed-%s" % sender._meta.label_lower
+        signals.post_save.connect(page_changed_handler, sender=sender, dispatch_uid=uid)
+        signals.post_delete.connect(
+            page_changed_handler, sender=sender, dispatch_uid=uid
+        )
+        node_moved.connect(page_changed_handler, sender=sender, dispatch_uid=uid)
+
+
+signals.class_prepared.connect(page_class_prepared_handler)
+
+
 # ------------------------------------------------------------------------
 class Page(BasePage):
     class Meta:
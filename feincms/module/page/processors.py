@@ -6,6 +6,8 @@ from django.conf import settings as django_settings
 from django.http import Http404, HttpResponseRedirect
 from django.views.decorators.http import condition
 
+from feincms.utils import uses_cookies
+
 
 logger = logging.getLogger(__name__)
 
@@ -100,11 +102,21 @@ def etag_response_processor(page, request, response):
     """
     Response processor to set an etag header on outgoing responses.
     The Page.etag() method must return something valid as etag content
-    whenever you want an etag header generated.
+    whenever you want an etag header generated. Responses which accessed the
+    session or the CSRF token while rendering do not get an etag.
     """
     etag = page.etag(request)
-    if etag is not None:
-        response["ETag"] = '"' + etag + '"'
+    if etag is None:
+        return
+
+    def add_header(response):
+        if not uses_cookies(request):
+            response["ETag"] = '"' + etag + '"'
+
+    if hasattr(response, "render") and not response.is_rendered:
+        response.add_post_render_callback(add_header)
+    else:
+        add_header(response)
 
 
 def debug_sql_queries_response_processor(verbose=False, file=sys.stderr):
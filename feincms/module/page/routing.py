@@ -0,0 +1,216 @@
+"""
+Process-local routing table for page lookups.
+
+When ``FEINCMS_PAGE_ROUTING_TABLE`` is enabled, ``page_for_path`` and
+``best_match_for_path`` resolve paths using a dictionary of the
+``_cached_url`` values of all pages which are active themselves and whose
+ancestors are active too. The dictionary is built once per process and
+database and is only rebuilt when the generation stored in Django's cache
+changes, which happens whenever a page is saved, deleted or moved. Resolving
+a path costs a cache lookup and a single primary key query then.
+
+Pages changed through ``QuerySet.update()`` do not change the generation;
+call ``invalidate_routing_table(Page)`` afterwards. Active filters depending
+on the current time (f.e. the datepublisher extension) are accounted for by
+rebuilding the table after ``FEINCMS_PAGE_ROUTING_TABLE_MAX_AGE`` seconds.
+Active filters depending on the current request cannot be used together
+with the routing table.
+
+When ``FEINCMS_PAGE_NEGATIVE_CACHE_SIZE`` is set, paths which did not match
+any page are remembered in a process-local, size-bounded LRU cache, so that
+requests for nonexistent URLs do not hit the database again until a page is
+saved, deleted or moved (or ``FEINCMS_PAGE_ROUTING_TABLE_MAX_AGE`` seconds
+have passed).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from feincms import settings
+from feincms.utils import on_commit_once
+
+
+_routing_tables = {}
+
+
+def _generation_key(model, using):
+    return "feincms:routing:{}:{}".format(
+        model._meta.concrete_model._meta.label_lower, using
+    )
+
+
+def _new_generation():
+    # Random values instead of a counter, so that an evicted key does not
+    # accidentally reuse the generation of an outdated table. The timestamp
+    # is used by generation_timestamp().
+    return "%d-%s" % (time.time(), uuid4().hex)
+
+
+def _current_generation(model, using):
+    key = _generation_key(model, using)
+    generation = cache.get(key)
+    if generation is None:
+        # Use a new generation if the cache does not store it (f.e. the
+        # DummyCache), so that nothing is reused when changes cannot be
+        # noticed
+        generation = _new_generation()
+        if not cache.add(key, generation, None):
+            # Another process has added a generation in the meantime
+            generation = cache.get(key) or generation
+    return generation
+
+
+def generation_timestamp(model, using="default"):
+    """
+    Returns the time of the last change of any page as a POSIX timestamp
+    (or a later time, if the generation has been evicted from the cache).
+    """
+
+    return int(_current_generation(model, using).split("-")[0])
+
+
+def page_generation_used(model):
+    """
+    Returns whether anything depends on the page generation of the model:
+    the routing table, the negative lookup cache, the response cache or the
+    ``conditional_get`` extension.
+    """
+
+    return bool(
+        settings.FEINCMS_PAGE_ROUTING_TABLE
+        or settings.FEINCMS_PAGE_NEGATIVE_CACHE_SIZE
+        or settings.FEINCMS_RESPONSE_CACHE_TIMEOUT
+        or getattr(model, "_feincms_page_generation_used", False)
+    )
+
+
+def invalidate_routing_table(model, using="default"):
+    """
+    Invalidates the routing tables of all processes. The generation is
+    changed again (once per transaction) after the current transaction has
+    been committed so that no other process keeps a table built from
+    uncommitted data.
+    """
+
+    key = _generation_key(model, using)
+
+    def set_generation():
+        cache.set(key, _new_generation(), None)
+
+    if transaction.get_connection(using).in_atomic_block:
+        set_generation()
+    on_commit_once(key, set_generation, using=using)
+
+
+def build_routing_table(manager):
+    """
+    Returns a dictionary mapping the ``_cached_url`` of all pages reachable
+    through the frontend to their primary key. The URLs of active pages with
+    inactive ancestors are mapped to ``None``; like the database lookups,
+    ``best_match_for_path`` does not fall back to shorter paths for them.
+    """
+
+    table = {}
+    reachable = set()
+    for pk, parent_id, url in (
+        manager.active()
+        .order_by("tree_id", "lft")
+        .values_list("pk", "parent_id", "_cached_url")
+    ):
+        # Ancestors come first in tree order
+        if parent_id is None or parent_id in reachable:
+            reachable.add(pk)
+            if table.get(url) is None:
+                table[url] = pk
+        else:
+            table.setdefault(url, None)
+    return table
+
+
+def routing_table(manager):
+    """
+    Returns the routing table of the manager's model and database, rebuilding
+    it if it is outdated.
+    """
+
+    model = manager.model._meta.concrete_model
+    using = manager.db
+    generation = _current_generation(model, using)
+
+    entry = _routing_tables.get((model, using))
+    if (
+        entry is None
+        or entry[0] != generation
+        or entry[1] < time.monotonic() - settings.FEINCMS_PAGE_ROUTING_TABLE_MAX_AGE
+    ):
+        entry = (generation, time.monotonic(), build_routing_table(manager))
+        _routing_tables[(model, using)] = entry
+    return entry[2]
+
+
+class NegativeLookupCache:
+    """
+    Process-local, size-bounded LRU set of paths which did not match any
+    page. Keys contain the generation of the page model, so entries become
+    unreachable when a page is saved, deleted or moved in any process.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, manager, kind, path):
+        model = manager.model._meta.concrete_model
+        return (
+            model._meta.label_lower,
+            manager.db,
+            _current_generation(model, manager.db),
+            kind,
+            path,
+        )
+
+    def __contains__(self, key):
+        with self._lock:
+            added = self._entries.get(key)
+            if added is None:
+                return False
+            if added < time.monotonic() - settings.FEINCMS_PAGE_ROUTING_TABLE_MAX_AGE:
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, key):
+        with self._lock:
+            self._entries[key] = time.monotonic()
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_negative_lookup_cache = None
+
+
+def negative_lookup_cache():
+    """
+    Returns the negative lookup cache or ``None`` if it is disabled.
+    """
+
+    global _negative_lookup_cache
+
+    maxsize = settings.FEINCMS_PAGE_NEGATIVE_CACHE_SIZE
+    if not maxsize:
+        return None
+    if _negative_lookup_cache is None or _negative_lookup_cache.maxsize != maxsize:
+        _negative_lookup_cache = NegativeLookupCache(maxsize)
+    return _negative_lookup_cache
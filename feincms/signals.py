@@ -17,3 +17,21 @@ from django.dispatch import Signal
 itemeditor_post_save_related = Signal()
 
 # ------------------------------------------------------------------------
+# This signal is sent when a content block has been saved or deleted. The
+# sender is the CMS base class (f.e. ``Page``), the keyword arguments are
+# the content block as ``instance``, ``deleted``, ``raw`` (``True`` when
+# loading fixtures) and ``parent_deleted`` (``True`` when the content block
+# is deleted together with its parent).
+
+content_changed = Signal()
+
+# ------------------------------------------------------------------------
+# This signal is sent by ``ContentObjectMixin`` when timings are enabled
+# (``FEINCMS_HANDLER_TIMINGS``) and the response has been rendered. The
+# sender is the class of the rendered object, the keyword arguments are the
+# object as ``instance``, ``request``, ``response`` and ``timings``, a
+# ``feincms.utils.timing.Timings`` instance.
+
+handler_timings = Signal()
+
+# ------------------------------------------------------------------------
@@ -13,6 +13,7 @@ from django.http import HttpRequest
 
 from feincms import settings as feincms_settings
 from feincms.module.page.extensions.navigation import PagePretender
+from feincms.module.page.models import prefetch_redirect_targets
 from feincms.utils.templatetags import (
     SimpleAssignmentNodeWithVarAndArgs,
     do_simple_assignment_node_with_var_and_args_helper,
@@ -166,7 +167,9 @@ def feincms_nav(context, feincms_page, level=1, depth=1, group=None):
 
     # Return a list, not a generator so that it can be consumed
     # several times in a template.
-    return list(queryset)
+    pages = list(queryset)
+    prefetch_redirect_targets(pages)
+    return pages
 
 
 # ------------------------------------------------------------------------
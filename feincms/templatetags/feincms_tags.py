@@ -3,12 +3,16 @@
 
 
 import logging
+from copy import copy
+from functools import partial
 
 from django import template
 from django.conf import settings
 from django.utils.safestring import mark_safe
 
 from feincms.utils import get_singleton, get_singleton_url
+from feincms.utils.streaming import deferred_regions_for
+from feincms.utils.timing import stage_name, timed
 
 
 register = template.Library()
@@ -28,7 +32,8 @@ def _render_content(content, **kwargs):
             return
         setattr(request, "feincms_render_level", level + 1)
 
-    r = content.render(**kwargs)
+    with timed(request, stage_name("content", content)):
+        r = content.render(**kwargs)
 
     if request is not None:
         level = getattr(request, "feincms_render_level", 1)
@@ -58,20 +63,58 @@ def _render_content(content, **kwargs):
     return r
 
 
-@register.simple_tag(takes_context=True)
-def feincms_render_region(context, feincms_object, region, request=None):
+def _render_region(context, feincms_object, region, request):
+    with timed(request, stage_name("region", region)):
+        return mark_safe(
+            "".join(
+                _render_content(content, request=request, context=context)
+                for content in getattr(feincms_object.content, region)
+            )
+        )
+
+
+def feincms_render_region(context, feincms_object, region, request=None, defer=True):
     """
     {% feincms_render_region feincms_page "main" request %}
     """
     if not feincms_object:
         return ""
 
-    return mark_safe(
-        "".join(
-            _render_content(content, request=request, context=context)
-            for content in getattr(feincms_object.content, region)
+    deferred = deferred_regions_for(request) if defer else None
+    if deferred is not None:
+        # Streaming response, render the region when it is sent
+        context = copy(context)
+        return mark_safe(
+            deferred.defer(
+                lambda: _render_region(context, feincms_object, region, request)
+            )
         )
-    )
+
+    return _render_region(context, feincms_object, region, request)
+
+
+#: Regions inside these tags are always rendered immediately when streaming
+#: responses, since the output of the tags is cached, captured or modified
+STREAMING_UNSAFE_TAGS = {"cache", "capture", "filter", "spaceless"}
+
+register.simple_tag(feincms_render_region, takes_context=True)
+_compile_render_region = register.tags["feincms_render_region"]
+
+
+@register.tag("feincms_render_region")
+def do_feincms_render_region(parser, token):
+    """
+    Compiles ``feincms_render_region`` like a simple tag, but never defers
+    regions which are assigned to a variable (``as var``) or which are
+    rendered inside one of the ``STREAMING_UNSAFE_TAGS``.
+    """
+    node = _compile_render_region(parser, token)
+    if node.target_var is not None or any(
+        command in STREAMING_UNSAFE_TAGS
+        for command, _token in getattr(parser, "command_stack", ())
+    ):
+        node.func = partial(feincms_render_region, defer=False)
+    return node
 
 
 @register.simple_tag(takes_context=True)
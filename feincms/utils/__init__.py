@@ -7,6 +7,7 @@ from importlib import import_module
 
 from django.apps import apps
 from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
 from django.db.models import AutoField, CharField
 
 from feincms import settings
@@ -93,6 +94,53 @@ def copy_model_instance(obj, exclude=None):
     return obj.__class__(**initial)
 
 
+# ------------------------------------------------------------------------
+def on_commit_once(key, func, using=None):
+    """
+    Runs ``func`` once after the current transaction has been committed, no
+    matter how often it is registered using the same ``key`` during the
+    transaction. Outside of transactions ``func`` is run immediately.
+
+    Returns ``True`` if ``func`` has been registered (or run) and ``False``
+    if a callback with the same key is pending already.
+    """
+
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block:
+        # Callbacks of rolled back transactions (and savepoints) are removed
+        # from run_on_commit, so those do not prevent registering again
+        for entry in connection.run_on_commit:
+            callback = entry[1]
+            if getattr(callback, "feincms_key", None) == key and not callback.done:
+                return False
+
+    def callback():
+        callback.done = True
+        func()
+
+    callback.feincms_key = key
+    callback.done = False
+    transaction.on_commit(callback, using=using)
+    return True
+
+
+# ------------------------------------------------------------------------
+def uses_cookies(request):
+    """
+    Returns whether the session or the CSRF token has been accessed while
+    handling the request, that is, whether the response depends on the
+    cookies sent by the client. Django < 4.1 sets ``CSRF_COOKIE_USED``
+    instead of ``CSRF_COOKIE_NEEDS_UPDATE`` when the token is accessed.
+    """
+
+    session = getattr(request, "session", None)
+    return bool(
+        (session is not None and session.accessed)
+        or request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+        or request.META.get("CSRF_COOKIE_USED")
+    )
+
+
 # ------------------------------------------------------------------------
 def shorten_string(str, max_length=50, ellipsis=" … "):
     """
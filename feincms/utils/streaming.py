@@ -0,0 +1,52 @@
+"""
+Support for streaming the regions of CMS objects.
+
+While the template of a streaming response is rendered,
+``feincms_render_region`` only outputs a placeholder and records how the
+region has to be rendered. The rendered template is then streamed up to each
+placeholder, and the region is rendered and sent when it is reached. This
+way, the ``<head>`` and everything before the first region is sent to the
+client before any content block is rendered.
+"""
+
+import re
+from uuid import uuid4
+
+
+class DeferredRegions:
+    """
+    Collects the regions whose rendering has been deferred while rendering
+    the template of a streaming response.
+    """
+
+    def __init__(self):
+        self.marker = "<!-- feincms-region-%s-" % uuid4().hex
+        self.regions = []
+
+    def defer(self, render):
+        """
+        Records the callable rendering a region and returns the placeholder
+        which is output instead.
+        """
+        self.regions.append(render)
+        return "%s%d -->" % (self.marker, len(self.regions) - 1)
+
+    def stream(self, content):
+        """
+        Yields the parts of the rendered template and the rendered regions
+        in order.
+        """
+        position = 0
+        for match in re.finditer(re.escape(self.marker) + r"(\d+) -->", content):
+            yield content[position : match.start()]
+            yield self.regions[int(match.group(1))]()
+            position = match.end()
+        yield content[position:]
+
+
+def deferred_regions_for(request):
+    """
+    Returns the ``DeferredRegions`` instance if the template of a streaming
+    response is being rendered for the request or ``None``.
+    """
+    return getattr(request, "_feincms_deferred_regions", None)
@@ -0,0 +1,92 @@
+"""
+Timing instrumentation of the request-response cycle of CMS objects.
+
+When ``FEINCMS_HANDLER_TIMINGS`` or ``FEINCMS_SERVER_TIMING_HEADER`` is
+enabled, ``ContentObjectMixin`` records the durations of the object lookup,
+of each request processor, of the ``process`` and ``finalize`` methods of
+each content block, of each response processor and of rendering the
+template (including each region and content block rendered using the
+``feincms_render_region`` and ``feincms_render_content`` template tags).
+The timings are sent using the ``feincms.signals.handler_timings`` signal
+once the response has been rendered and are optionally added to the response
+as ``Server-Timing`` header.
+"""
+
+import re
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+
+_invalid_token_characters = re.compile(r"[^\w!#$%&'*+\-.^`|~]")
+
+
+class Timings:
+    """
+    Ordered list of ``(stage, seconds)`` tuples. Stages may be nested and
+    may occur several times (f.e. when a page contains several content
+    blocks of the same type).
+    """
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.stages = []
+
+    def add(self, name, duration):
+        self.stages.append((name, duration))
+
+    @contextmanager
+    def stage(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start)
+
+    def totals(self):
+        """
+        Returns a dictionary of stage names and their summed durations in the
+        order the stages first occurred.
+        """
+        totals = {}
+        for name, duration in self.stages:
+            totals[name] = totals.get(name, 0) + duration
+        return totals
+
+    def server_timing(self):
+        """
+        Returns the value of the ``Server-Timing`` header.
+        """
+        return ", ".join(
+            "%s;dur=%.1f" % (_invalid_token_characters.sub("-", name), 1000 * duration)
+            for name, duration in self.totals().items()
+        )
+
+
+def timings_for(request):
+    """
+    Returns the timings collected for the request or ``None``.
+    """
+    return getattr(request, "_feincms_timings", None)
+
+
+def timed(request, name):
+    """
+    Context manager recording the duration of a stage if timings are
+    collected for the request.
+    """
+    timings = timings_for(request)
+    if timings is None:
+        return nullcontext()
+    return timings.stage(name)
+
+
+def stage_name(prefix, obj):
+    """
+    Returns a stage name for a processor (or a processor key) or a content
+    block.
+    """
+    if isinstance(obj, str):
+        return f"{prefix}.{obj}"
+    return "{}.{}".format(
+        prefix, getattr(obj, "__name__", None) or obj.__class__.__name__
+    )
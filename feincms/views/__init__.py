@@ -1,11 +1,17 @@
+import hashlib
 import logging
 
 from django.apps import apps
+from django.core.cache import cache
 from django.http import Http404
+from django.utils.cache import get_max_age
 from django.utils.functional import cached_property
+from django.utils.translation import get_language
 
 from feincms import settings
 from feincms.module.mixins import ContentView
+from feincms.module.page import routing
+from feincms.utils import uses_cookies
 
 
 logger = logging.getLogger(__name__)
@@ -30,11 +36,158 @@ class Handler(ContentView):
             self.request, raise404=True, best_match=True, path=path
         )
 
+    def get_response_cache_key(self):
+        """
+        Returns the key of the response in the response cache, or ``None`` if
+        the response cannot be cached. Responses are cached per page, content
+        generation of the page (and of its ancestors if the template has
+        inherited regions), page generation (which changes when any page is
+        saved, deleted or moved), language, scheme, host, path (which
+        contains the extra path), query string and the values of the request
+        headers listed in ``FEINCMS_RESPONSE_CACHE_VARY``.
+        """
+
+        page = self.object
+        generation = getattr(page, "content_generation", None)
+        if (
+            not settings.FEINCMS_RESPONSE_CACHE_TIMEOUT
+            or self.request.method not in ("GET", "HEAD")
+            or generation is None
+        ):
+            return None
+
+        generations = [generation]
+        if hasattr(page, "get_ancestors") and any(
+            region.inherited for region in page.template.regions
+        ):
+            generations.extend(
+                page.get_ancestors().values_list("content_generation", flat=True)
+            )
+
+        parts = [
+            page._meta.label_lower,
+            page.pk,
+            generations,
+            routing._current_generation(page.__class__, page._state.db),
+            get_language(),
+            self.request.build_absolute_uri(self.request.path),
+            self.request.GET.urlencode(),
+            [
+                self.request.headers.get(header)
+                for header in settings.FEINCMS_RESPONSE_CACHE_VARY
+            ],
+        ]
+        return "feincms:response:%s" % hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def get_404_response_cache_key(self):
+        """
+        Returns the key of the response of the ``FEINCMS_CMS_404_PAGE`` in
+        the response cache, or ``None`` if the response cannot be cached.
+        The key does not contain the requested path, so that requests for
+        any unknown path are served from the cache without looking up or
+        rendering the 404 page. Since the content generation is not known
+        without loading the page, the key depends on the page generation
+        (which changes when any page is saved, deleted or moved), language,
+        scheme, host, query string and the values of the request headers
+        listed in ``FEINCMS_RESPONSE_CACHE_VARY``.
+        """
+
+        if not settings.FEINCMS_RESPONSE_CACHE_TIMEOUT:
+            return None
+        if self.request.method not in ("GET", "HEAD"):
+            return None
+
+        parts = [
+            self.page_model._meta.label_lower,
+            settings.FEINCMS_CMS_404_PAGE,
+            routing._current_generation(
+                self.page_model, self.page_model._default_manager.db
+            ),
+            get_language(),
+            self.request.build_absolute_uri("/"),
+            self.request.GET.urlencode(),
+            [
+                self.request.headers.get(header)
+                for header in settings.FEINCMS_RESPONSE_CACHE_VARY
+            ],
+        ]
+        return "feincms:response404:%s" % hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def is_response_cacheable(self, response, status_code=200):
+        """
+        Only responses with the passed status code are cached (successful
+        responses, or the 404 responses of the ``FEINCMS_CMS_404_PAGE``).
+        Responses setting cookies, responses marked private or uncacheable
+        using ``Cache-Control`` (f.e. by application contents or response
+        processors) and responses varying on request headers not listed in
+        ``FEINCMS_RESPONSE_CACHE_VARY`` are not cached either. Responses
+        which accessed the session or the CSRF token are treated as varying
+        on ``Cookie`` since the middleware only adds the header later.
+        """
+
+        if (
+            response.status_code != status_code
+            or response.streaming
+            or response.cookies
+        ):
+            return False
+
+        cache_control = {
+            directive.strip().split("=")[0].lower()
+            for directive in response.get("Cache-Control", "").split(",")
+        }
+        if cache_control & {"private", "no-cache", "no-store"}:
+            return False
+        if get_max_age(response) == 0:
+            return False
+
+        vary = {
+            header.strip().lower()
+            for header in response.get("Vary", "").split(",")
+            if header.strip()
+        }
+        if uses_cookies(self.request):
+            vary.add("cookie")
+        return vary <= {
+            header.lower() for header in settings.FEINCMS_RESPONSE_CACHE_VARY
+        }
+
+    def get_cached_response(self):
+        self._response_cache_key = self.get_response_cache_key()
+        if self._response_cache_key is not None:
+            return cache.get(self._response_cache_key)
+        return None
+
+    def cache_response(self, response, key=None, status_code=200):
+        if key is None:
+            key = getattr(self, "_response_cache_key", None)
+        if key is None:
+            return
+
+        def store(response):
+            if self.is_response_cacheable(response, status_code=status_code):
+                timeout = settings.FEINCMS_RESPONSE_CACHE_TIMEOUT
+                max_age = get_max_age(response)
+                if max_age is not None:
+                    timeout = min(timeout, max_age)
+                cache.set(key, response, timeout)
+
+        if hasattr(response, "render") and not response.is_rendered:
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+
     def dispatch(self, request, *args, **kwargs):
         try:
             return super().dispatch(request, *args, **kwargs)
         except Http404 as e:
             if settings.FEINCMS_CMS_404_PAGE is not None:
+                key = self.get_404_response_cache_key()
+                if key is not None:
+                    response = cache.get(key)
+                    if response is not None:
+                        return response
+
                 logger.info(
                     "Http404 raised for '%s', attempting redirect to"
                     " FEINCMS_CMS_404_PAGE",
@@ -58,6 +211,12 @@ class Handler(ContentView):
                     # example a redirect, overwriting would yield a blank page
                     if response.status_code == 200:
                         response.status_code = 404
+                        if (
+                            key is not None
+                            and getattr(self.object, "content_generation", None)
+                            is not None
+                        ):
+                            self.cache_response(response, key=key, status_code=404)
                     return response
                 except Http404:
                     logger.error(
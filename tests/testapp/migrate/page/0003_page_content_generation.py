@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("page", "0002_alter_applicationcontent_parent_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="page",
+            name="content_generation",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="content generation"
+            ),
+        ),
+    ]
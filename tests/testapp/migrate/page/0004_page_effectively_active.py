@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+from feincms.module.page.extensions.effectively_active import (
+    rebuild_effectively_active,
+)
+
+
+def initialize_effectively_active(apps, schema_editor):
+    rebuild_effectively_active(
+        apps.get_model("page", "Page"), using=schema_editor.connection.alias
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("page", "0003_page_content_generation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="page",
+            name="_effectively_active",
+            field=models.BooleanField(
+                db_index=True,
+                default=False,
+                editable=False,
+                verbose_name="effectively active",
+            ),
+        ),
+        migrations.RunPython(initialize_effectively_active, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("testapp", "0002_alter_category_level_alter_category_lft_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MyModelRawContent",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("text", models.TextField(blank=True, verbose_name="content")),
+                ("region", models.CharField(max_length=255)),
+                ("ordering", models.IntegerField(default=0, verbose_name="ordering")),
+                (
+                    "parent",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="%(class)s_set",
+                        to="testapp.mymodel",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "raw content",
+                "verbose_name_plural": "raw contents",
+                "db_table": "testapp_mymodel_mymodelrawcontent",
+                "ordering": ["ordering"],
+                "permissions": [],
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="MyModelContentIndex",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("region", models.CharField(max_length=255)),
+                ("content_pk", models.PositiveIntegerField()),
+                ("ordering", models.IntegerField(default=0)),
+                (
+                    "content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+                (
+                    "parent",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="testapp.mymodel",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "content index entry",
+                "verbose_name_plural": "content index entries",
+                "db_table": "testapp_mymodel_contentindex",
+                "ordering": ["ordering"],
+                "indexes": [
+                    models.Index(
+                        fields=["parent", "region", "ordering"],
+                        name="testapp_mym_parent__1b80c2_idx",
+                    )
+                ],
+                "unique_together": {("content_type", "content_pk")},
+            },
+        ),
+    ]
@@ -72,6 +72,9 @@ Page.register_extensions(
     "feincms.extensions.ct_tracker",
     "feincms.extensions.seo",
     "feincms.extensions.changedate",
+    "feincms.extensions.content_generation",
+    "feincms.module.page.extensions.effectively_active",
+    "feincms.module.page.extensions.conditional_get",
     "feincms.extensions.seo",  # duplicate
     "feincms.module.page.extensions.navigation",
     "feincms.module.page.extensions.symlinks",
@@ -124,3 +127,6 @@ MyModel.register_regions(("main", "Main region"))
 unchanged = CustomContentType
 MyModel.create_content_type(CustomContentType)
 assert CustomContentType is unchanged
+
+MyModel.create_content_type(RawContent, class_name="MyModelRawContent")
+MyModel.register_extensions("feincms.extensions.content_index")
@@ -1,9 +1,13 @@
 from django.conf import settings as django_settings
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
 from django.template.defaultfilters import slugify
 from django.test import RequestFactory, TestCase
 from django.utils import translation
+from testapp.models import MyModel
 
+from feincms.contents import RawContent
+from feincms.extensions.content_index import rebuild_content_index
 from feincms.extensions.translations import (
     translation_set_language,
     user_has_language_set,
@@ -114,3 +118,45 @@ class TranslationTestCase(TestCase):
 
         c_key = django_settings.LANGUAGE_COOKIE_NAME
         self.assertEqual(response.cookies[c_key].value, "en")
+
+
+class ContentIndexTestCase(TestCase):
+    def test_content_index(self):
+        obj = MyModel.objects.create()
+        first = obj.mymodelrawcontent_set.create(
+            region="main", ordering=1, text="first"
+        )
+        obj.mymodelrawcontent_set.create(region="main", ordering=0, text="zeroth")
+        obj.customcontenttype_set.create(region="main", ordering=2)
+
+        index = MyModel._feincms_content_index.objects.filter(parent=obj)
+        self.assertEqual(index.count(), 3)
+
+        # Prime Django content type cache
+        ContentType.objects.get_for_models(*MyModel._feincms_content_types)
+
+        # One query for the index and one query per content type
+        obj = MyModel.objects.get(pk=obj.pk)
+        self.assertNumQueries(3, lambda: obj.content.main)
+        self.assertEqual(
+            [c.__class__.__name__ for c in obj.content.main],
+            ["MyModelRawContent", "MyModelRawContent", "CustomContentType"],
+        )
+        self.assertEqual(obj.content.all_of_type(RawContent)[0].text, "zeroth")
+
+        first.ordering = 3
+        first.save()
+        self.assertEqual(
+            index.get(
+                content_type=ContentType.objects.get_for_model(first),
+                content_pk=first.pk,
+            ).ordering,
+            3,
+        )
+
+        first.delete()
+        self.assertEqual(index.count(), 2)
+
+        index.delete()
+        rebuild_content_index(MyModel)
+        self.assertEqual(index.count(), 2)
@@ -4,17 +4,26 @@
 
 import os
 from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 
+import django
+from asgiref.sync import sync_to_async
 from django import forms, template
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
-from django.db import models
-from django.http import Http404, HttpResponseBadRequest
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.management import call_command
+from django.db import connection, models
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.middleware import csrf
 from django.template import TemplateDoesNotExist
 from django.template.defaultfilters import slugify
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.encoding import force_str
@@ -24,12 +33,29 @@ from feincms import settings as feincms_settings
 from feincms.content.application.models import app_reverse
 from feincms.contents import RawContent
 from feincms.context_processors import add_page_if_missing
-from feincms.models import ContentProxy
+from feincms.extensions import ct_tracker
+from feincms.extensions.content_generation import bump_content_generation
+from feincms.extensions.ct_tracker import TrackerContentProxy
+from feincms.models import (
+    ContentCache,
+    ContentProxy,
+    _class_media_cache,
+    _content_media_kinds,
+    prefetch_content,
+)
 from feincms.module.medialibrary.models import Category, MediaFile
+from feincms.module.mixins import processor_options
+from feincms.module.page import routing
+from feincms.module.page.extensions.effectively_active import (
+    rebuild_effectively_active,
+)
 from feincms.module.page.extensions.navigation import PagePretender
-from feincms.module.page.models import Page
+from feincms.module.page.models import Page, prefetch_redirect_targets
+from feincms.module.page.sitemap import PageSitemap
+from feincms.signals import handler_timings
 from feincms.templatetags import feincms_page_tags
 from feincms.translations import short_language_code
+from feincms.utils.streaming import DeferredRegions
 
 from .test_stuff import Empty
 
@@ -61,6 +87,7 @@ class PagesTestCase(TestCase):
                     ("main", "Main content area"),
                     ("sidebar", "Sidebar", "inherited"),
                 ),
+                "streaming": True,
             },
         )
 
@@ -566,18 +593,23 @@ class PagesTestCase(TestCase):
         for ct in Page._feincms_content_types:
             ContentType.objects.get_for_model(ct)
 
-        if hasattr(self, "assertNumQueries"):
-            # 5 queries: Two to get the content types of page and page2, one to
-            # fetch all ancestor PKs of page2 and one to materialize the
-            # RawContent instances belonging to page's sidebar and page2's main
-            # and a few queries to update the pages _ct_inventory attributes:
-            # - one update to update page2
-            # - one update to clobber the _ct_inventory attribute of all
-            #   descendants of page2
-            self.assertNumQueries(
-                5, lambda: [page2.content.main, page2.content.sidebar]
-            )
-            self.assertNumQueries(0, lambda: page2.content.sidebar[0].render())
+        feincms_settings.FEINCMS_CT_TRACKER_WRITE_ON_READ = True
+        try:
+            if hasattr(self, "assertNumQueries"):
+                # 5 queries: Two to get the content types of page and page2,
+                # one to fetch all ancestor PKs of page2 and one to materialize
+                # the RawContent instances belonging to page's sidebar and
+                # page2's main and a few queries to update the pages
+                # _ct_inventory attributes:
+                # - one update to update page2
+                # - one update to clobber the _ct_inventory attribute of all
+                #   descendants of page2
+                self.assertNumQueries(
+                    5, lambda: [page2.content.main, page2.content.sidebar]
+                )
+                self.assertNumQueries(0, lambda: page2.content.sidebar[0].render())
+        finally:
+            feincms_settings.FEINCMS_CT_TRACKER_WRITE_ON_READ = False
 
         self.assertEqual(page2.content.sidebar[0].render(), "Something")
 
@@ -836,6 +868,7 @@ class PagesTestCase(TestCase):
 
         Page.objects.all().update(active=True, in_navigation=True)
         Page.objects.filter(id__in=(5, 9, 19)).update(in_navigation=False)
+        rebuild_effectively_active(Page)
 
         tests = [
             (
@@ -1111,6 +1144,8 @@ class PagesTestCase(TestCase):
         self.create_default_page_set()
 
         page = Page.objects.get(pk=1)
+        page.active = True
+        page.save()
 
         self.assertEqual(len(page.extended_navigation()), 0)
 
@@ -1413,6 +1448,7 @@ class PagesTestCase(TestCase):
     def test_30_context_processors(self):
         self.create_default_page_set()
         Page.objects.update(active=True, in_navigation=True)
+        rebuild_effectively_active(Page)
 
         request = Empty()
         request.GET = {}
@@ -1495,6 +1531,7 @@ class PagesTestCase(TestCase):
         page.save()
 
         Page.objects.update(active=True)
+        rebuild_effectively_active(Page)
 
         self.login()
         self.create_page_through_admin(
@@ -1659,3 +1696,1358 @@ class PagesTestCase(TestCase):
         response = self.client.get(page.get_absolute_url())
         self.assertContains(response, "TemplateContent_1")
         self.assertContains(response, "#42#")
+
+    def test_42_single_query_content_proxy(self):
+        self.create_default_page_set()
+
+        page = Page.objects.get(pk=1)
+        page.rawcontent_set.create(region="sidebar", ordering=0, text="Something")
+        page.rawcontent_set.create(region="main", ordering=0, text="Anything")
+
+        page2 = Page.objects.get(pk=2)
+        page2.rawcontent_set.create(region="main", ordering=2, text="Whatever")
+        page2.applicationcontent_set.create(
+            region="main",
+            ordering=1,
+            urlconf_path="testapp.applicationcontent_urls",
+            parameters={"exclusive_subpages": True},
+        )
+
+        class SingleQueryContentProxy(ContentProxy):
+            single_query = True
+
+        page.content_proxy_class = SingleQueryContentProxy
+        page2.content_proxy_class = SingleQueryContentProxy
+
+        # One query for all content blocks, no count query
+        self.assertNumQueries(1, lambda: [page.content.main, page.content.sidebar])
+        self.assertIs(page.content.main[0].parent, page)
+
+        # Inherited regions: page2's content, ancestor PKs, ancestor content
+        # and the ancestors themselves
+        self.assertNumQueries(4, lambda: [page2.content.main, page2.content.sidebar])
+        self.assertNumQueries(0, lambda: page2.content.sidebar[0].render())
+        self.assertEqual(
+            [c.__class__.__name__ for c in page2.content.main],
+            ["ApplicationContent", "RawContent"],
+        )
+        self.assertEqual(page2.content.main[0].parameters, {"exclusive_subpages": True})
+        self.assertEqual(page2.content.main[1].text, "Whatever")
+        self.assertEqual(page2.content.sidebar[0].render(), "Something")
+        self.assertEqual(len(page2.content.all_of_type(RawContent)), 2)
+
+    def test_43_prefetch_content(self):
+        self.create_default_page_set()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            page = Page.objects.get(pk=1)
+            page.rawcontent_set.create(region="sidebar", ordering=0, text="Something")
+            page.rawcontent_set.create(region="main", ordering=0, text="Anything")
+
+            page2 = Page.objects.get(pk=2)
+            page2.rawcontent_set.create(region="main", ordering=1, text="Whatever")
+            page2.templatecontent_set.create(
+                region="main", ordering=0, template="templatecontent_1.html"
+            )
+
+        # The ct_tracker inventories replace the count queries
+        pages = list(Page.objects.order_by("id"))
+        self.assertNumQueries(2, lambda: prefetch_content(pages))
+        self.assertNumQueries(
+            0, lambda: [pages[1].content.main, pages[1].content.sidebar]
+        )
+        self.assertEqual(pages[1].content.sidebar[0].text, "Something")
+
+        Page.objects.update(_ct_inventory=None)
+        pages = list(Page.objects.order_by("id"))
+
+        # One count query for all pages, two queries to resolve page2's
+        # inherited sidebar and one query per content type in use
+        self.assertNumQueries(5, lambda: prefetch_content(pages, regions=("main",)))
+        self.assertNumQueries(0, lambda: [pages[0].content.main, pages[1].content.main])
+        self.assertEqual(
+            [c.__class__.__name__ for c in pages[1].content.main],
+            ["TemplateContent", "RawContent"],
+        )
+        self.assertEqual(pages[0].content.main[0].text, "Anything")
+
+        # Regions which have not been prefetched are loaded on demand
+        self.assertNumQueries(1, lambda: pages[1].content.sidebar)
+        self.assertEqual(pages[1].content.sidebar[0].text, "Something")
+
+        # Content which has already been loaded is not loaded again
+        self.assertNumQueries(0, lambda: prefetch_content(pages[1:]))
+
+    def test_44_inheritance_from_all_ancestors(self):
+        root = self.create_page("Root")
+        child = self.create_page("Child", parent=root)
+        grandchild = self.create_page("Grandchild", parent=child)
+
+        root.rawcontent_set.create(region="sidebar", ordering=0, text="Root")
+        grandchild.rawcontent_set.create(region="main", ordering=0, text="Main")
+
+        grandchild = Page.objects.get(pk=grandchild.pk)
+        grandchild.content_proxy_class = ContentProxy
+
+        # Own counts, ancestor PKs, counts of all ancestors at once and the
+        # RawContent instances
+        self.assertNumQueries(
+            4, lambda: [grandchild.content.main, grandchild.content.sidebar]
+        )
+        self.assertEqual(grandchild.content.sidebar[0].text, "Root")
+
+        # The nearest ancestor with content wins
+        child.rawcontent_set.create(region="sidebar", ordering=0, text="Child")
+
+        grandchild = Page.objects.get(pk=grandchild.pk)
+        grandchild.content_proxy_class = ContentProxy
+        self.assertEqual(
+            [c.text for c in grandchild.content.sidebar],
+            ["Child"],
+        )
+
+    def test_45_lazy_regions(self):
+        page = self.create_page()
+        page.rawcontent_set.create(region="main", ordering=0, text="Main")
+        page.templatecontent_set.create(
+            region="main", ordering=1, template="templatecontent_1.html"
+        )
+        page.rawcontent_set.create(region="sidebar", ordering=0, text="Sidebar")
+
+        class LazyContentProxy(ContentProxy):
+            lazy_regions = True
+
+        page = Page.objects.get(pk=page.pk)
+        page.content_proxy_class = LazyContentProxy
+
+        # Counts and the RawContent instances of the sidebar only
+        self.assertNumQueries(2, lambda: page.content.sidebar)
+        self.assertEqual(page.content.sidebar[0].text, "Sidebar")
+
+        self.assertNumQueries(2, lambda: page.content.main)
+        self.assertEqual(
+            [c.__class__.__name__ for c in page.content.main],
+            ["RawContent", "TemplateContent"],
+        )
+        self.assertNumQueries(0, lambda: page.content.all_of_type(RawContent))
+        self.assertEqual(len(page.content.all_of_type(RawContent)), 2)
+
+    def test_46_content_generation(self):
+        page = self.create_page()
+        self.assertEqual(page.content_generation, 0)
+
+        def generation(page):
+            return Page.objects.values_list("content_generation", flat=True).get(
+                pk=page.pk
+            )
+
+        stale = Page.objects.get(pk=page.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            content = page.rawcontent_set.create(region="main", ordering=0, text="Hi")
+        self.assertEqual(generation(page), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            content.text = "Hello"
+            content.save()
+        self.assertEqual(generation(page), 2)
+
+        # Saving an outdated instance does not reset the counter
+        stale.title = "Changed"
+        stale.save()
+        self.assertEqual(generation(page), 2)
+
+        # The counter is bumped once per transaction
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            page.rawcontent_set.create(region="main", ordering=1, text="Two")
+            page.rawcontent_set.create(region="sidebar", ordering=0, text="Three")
+        self.assertEqual(
+            len(
+                [
+                    callback
+                    for callback in callbacks
+                    if callback.feincms_key[0] == "content_generation"
+                ]
+            ),
+            1,
+        )
+        self.assertEqual(generation(page), 3)
+
+        page2 = self.create_page("page2")
+        with self.captureOnCommitCallbacks(execute=True):
+            page2.copy_content_from(page)
+        self.assertEqual(page2.content_generation, 1)
+        self.assertEqual(generation(page2), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            page2.replace_content_with(page)
+        self.assertEqual(generation(page2), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            content.delete()
+        self.assertEqual(generation(page), 4)
+
+    def test_47_content_cache(self):
+        page1 = self.create_page()
+        page2 = self.create_page("page2", parent=page1)
+        page1.rawcontent_set.create(region="main", ordering=0, text="Main")
+        page1.rawcontent_set.create(region="sidebar", ordering=0, text="Sidebar")
+        page2.rawcontent_set.create(region="main", ordering=0, text="Child")
+
+        class CachedContentProxy(ContentProxy):
+            content_cache = ContentCache(2)
+
+        def load(pk):
+            page = Page.objects.get(pk=pk)
+            page.content_proxy_class = CachedContentProxy
+            return page
+
+        page = load(page2.pk)
+        self.assertNumQueries(4, lambda: [page.content.main, page.content.sidebar])
+        self.assertEqual(len(CachedContentProxy.content_cache), 1)
+
+        # The key only contains fields of the page itself
+        page = load(page2.pk)
+        self.assertNumQueries(0, lambda: [page.content.main, page.content.sidebar])
+        self.assertEqual(page.content.main[0].text, "Child")
+        self.assertIs(page.content.main[0].parent, page)
+        self.assertEqual(page.content.sidebar[0].text, "Sidebar")
+        self.assertEqual(page.content.sidebar[0].parent.pk, page1.pk)
+
+        # Changing inherited content evicts the entry
+        page1.rawcontent_set.filter(region="sidebar").get().delete()
+        self.assertEqual(len(CachedContentProxy.content_cache), 0)
+        page = load(page2.pk)
+        self.assertEqual(page.content.sidebar, [])
+
+        # Entries are bounded
+        page3 = self.create_page("page3")
+        page4 = self.create_page("page4")
+        for pk in (page1.pk, page3.pk, page4.pk):
+            load(pk).content.main  # noqa: B018
+        self.assertEqual(len(CachedContentProxy.content_cache), 2)
+        page = load(page4.pk)
+        self.assertNumQueries(0, lambda: page.content.main)
+
+    def test_48_content_media(self):
+        page = self.create_page()
+        page.rawcontent_set.create(region="main", ordering=0, text="Hi")
+        template = page.templatecontent_set.create(
+            region="main", ordering=1, template="templatecontent_1.html"
+        )
+        page.rawcontent_set.create(region="sidebar", ordering=0, text="Hi")
+
+        raw_content = Page.content_type_for(RawContent)
+        template_content = template.__class__
+        raw_content.media = forms.Media(js=("raw.js",))
+        template_content.media = property(
+            lambda self: forms.Media(js=("template-%s.js" % self.pk,))
+        )
+        _content_media_kinds.clear()
+        try:
+            page = Page.objects.get(pk=page.pk)
+            page.content_proxy_class = ContentProxy
+            self.assertEqual(
+                page.content.media._js, ["raw.js", "template-%s.js" % template.pk]
+            )
+            self.assertIn((raw_content,), _class_media_cache)
+
+            # Media is merged in the order the content blocks appear
+            template_content.media = forms.Media(js=("template.js",))
+            _content_media_kinds.clear()
+            raw_content.objects.filter(region="main").update(ordering=2)
+            page = Page.objects.get(pk=page.pk)
+            page.content_proxy_class = ContentProxy
+            self.assertEqual(page.content.media._js, ["template.js", "raw.js"])
+            self.assertIn((template_content, raw_content), _class_media_cache)
+        finally:
+            del raw_content.media
+            del template_content.media
+            _content_media_kinds.clear()
+
+    def test_49_all_of_type_index(self):
+        raw_content = Page.content_type_for(RawContent)
+        self.assertEqual(Page._feincms_content_types_by_base[RawContent], [raw_content])
+        self.assertIn(raw_content, Page._feincms_content_types_by_base[models.Model])
+        self.assertIsNone(Page.content_type_for(Page))
+
+        page = self.create_page()
+        page.rawcontent_set.create(region="main", ordering=1, text="Second")
+        page.rawcontent_set.create(region="sidebar", ordering=0, text="First")
+        page = Page.objects.get(pk=page.pk)
+        page.content_proxy_class = ContentProxy
+
+        with self.assertNumQueries(2):
+            contents = page.content.all_of_type(RawContent)
+        self.assertEqual([c.text for c in contents], ["First", "Second"])
+        self.assertNumQueries(0, lambda: page.content.all_of_type((RawContent,)))
+        self.assertNumQueries(0, lambda: page.content.all_of_type(()))
+        self.assertEqual(
+            len(page.content.all_of_type(tuple(Page._feincms_content_types))), 2
+        )
+
+    async def test_50_async_content_loading(self):
+        page = await sync_to_async(self.create_page)()
+        await sync_to_async(page.rawcontent_set.create)(
+            region="main", ordering=0, text="Main"
+        )
+        await sync_to_async(page.templatecontent_set.create)(
+            region="main", ordering=1, template="templatecontent_1.html"
+        )
+        get_page = sync_to_async(Page.objects.get)
+        page = await get_page(pk=page.pk)
+        page.content_proxy_class = ContentProxy
+
+        self.assertEqual(await page.content.aregion("sidebar"), [])
+        main = await page.content.aregion("main")
+        self.assertEqual(
+            [c.__class__.__name__ for c in main], ["RawContent", "TemplateContent"]
+        )
+        self.assertIs(main[0].parent.content, page.content)
+
+        page = await get_page(pk=page.pk)
+        page.content_proxy_class = ContentProxy
+        await page.content.aload()
+        self.assertEqual(page.content.main[0].text, "Main")
+
+        # Querysets do not support async iteration before Django 4.1
+        page = await get_page(pk=page.pk)
+        page.content_proxy_class = ContentProxy
+        with mock.patch.object(django, "VERSION", (4, 0)):
+            await page.content.aload()
+        self.assertEqual(page.content.main[0].text, "Main")
+
+    def test_51_ct_tracker_targeted_invalidation(self):
+        page1 = self.create_page()
+        page2 = self.create_page("page2", parent=page1)
+        page3 = self.create_page("page3", parent=page2)
+        with self.captureOnCommitCallbacks(execute=True):
+            sidebar = page1.rawcontent_set.create(
+                region="sidebar", ordering=0, text="A"
+            )
+
+        def inventory(page):
+            return Page.objects.get(pk=page.pk)._ct_inventory
+
+        # Rebuild the inventories
+        for page in (page2, page3):
+            Page.objects.get(pk=page.pk).save()
+        self.assertEqual(len(inventory(page3)["sidebar"]), 1)
+
+        # Saving a page without moving it keeps the inventories of descendants
+        Page.objects.get(pk=page1.pk).save()
+        self.assertNotEqual(inventory(page2), {})
+
+        # Changes to regions which are not inherited and changes which do not
+        # affect the inventory keep the inventories of descendants
+        with self.captureOnCommitCallbacks(execute=True):
+            page1.rawcontent_set.create(region="main", ordering=0, text="Main")
+            sidebar.text = "B"
+            sidebar.save()
+        self.assertNotEqual(inventory(page2), {})
+        self.assertNotEqual(inventory(page3), {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            page1.rawcontent_set.create(region="sidebar", ordering=1, text="C")
+        self.assertEqual(inventory(page2), {})
+        self.assertEqual(inventory(page3), {})
+
+        # Moving a page clears the inventories of its descendants
+        Page.objects.get(pk=page3.pk).save()
+        page4 = self.create_page("page4")
+        page2 = Page.objects.get(pk=page2.pk)
+        page2.move_to(page4)
+        self.assertEqual(inventory(page3), {})
+        self.assertNotEqual(inventory(page2), {})
+
+    def test_52_ct_tracker_inventory_version(self):
+        page1 = self.create_page()
+        page2 = self.create_page("page2", parent=page1)
+        sidebar = page1.rawcontent_set.create(region="sidebar", ordering=1, text="B")
+        page1.templatecontent_set.create(
+            region="sidebar", ordering=0, template="templatecontent_1.html"
+        )
+        main = page2.rawcontent_set.create(region="main", ordering=0, text="Main")
+
+        page2 = Page.objects.get(pk=page2.pk)
+        page2.save()
+        page2 = Page.objects.get(pk=page2.pk)
+        raw_ct = ContentType.objects.get_for_model(sidebar.__class__).pk
+        self.assertEqual(page2._ct_inventory["_version_"], 2)
+        self.assertEqual(page2._ct_inventory["main"], [[page2.pk, raw_ct, main.pk, 0]])
+        self.assertEqual(
+            [block[2:] for block in page2._ct_inventory["sidebar"]],
+            [[page1.templatecontent_set.get().pk, 0], [sidebar.pk, 1]],
+        )
+
+        # One query per content type, using the stored order
+        self.assertNumQueries(2, lambda: [page2.content.main, page2.content.sidebar])
+        self.assertEqual(
+            [c.__class__.__name__ for c in page2.content.sidebar],
+            ["TemplateContent", "RawContent"],
+        )
+
+        # Inventories of version 1 are still used
+        template_ct = ContentType.objects.get_for_model(
+            page1.templatecontent_set.get().__class__
+        ).pk
+        inventory = {
+            "main": [[page2.pk, raw_ct]],
+            "sidebar": [[page1.pk, raw_ct], [page1.pk, template_ct]],
+            "_version_": 1,
+        }
+        Page.objects.filter(pk=page2.pk).update(_ct_inventory=inventory)
+        page2 = Page.objects.get(pk=page2.pk)
+        self.assertNumQueries(2, lambda: [page2.content.main, page2.content.sidebar])
+        self.assertEqual(len(page2.content.sidebar), 2)
+
+    def test_53_rebuild_ct_inventories(self):
+        page1 = self.create_page()
+        page2 = self.create_page("page2", parent=page1)
+        page3 = self.create_page("page3", parent=page2)
+        page1.rawcontent_set.create(region="sidebar", ordering=0, text="Side")
+        page2.rawcontent_set.create(region="main", ordering=0, text="Main")
+        for page in Page.objects.all():
+            page.save()
+        expected = dict(Page.objects.values_list("pk", "_ct_inventory"))
+        self.assertEqual(len(expected[page3.pk]["sidebar"]), 1)
+
+        Page.objects.update(_ct_inventory=None)
+        out = StringIO()
+        with self.assertNumQueries(10):
+            # Primary keys, two batches of one query to load the pages, two
+            # queries to list content blocks and one bulk update, and one
+            # query for the ancestors of page3 which are not in its batch
+            call_command(
+                "rebuild_ct_inventories", "page.Page", batch_size=2, stdout=out
+            )
+        self.assertEqual(
+            dict(Page.objects.values_list("pk", "_ct_inventory")), expected
+        )
+        self.assertIn("page.Page: 3/3 objects", out.getvalue())
+
+        Page.objects.filter(pk=page3.pk).update(_ct_inventory=None)
+        call_command("rebuild_ct_inventories", missing=True, stdout=out)
+        self.assertEqual(
+            dict(Page.objects.values_list("pk", "_ct_inventory")), expected
+        )
+
+    def test_54_routing_table(self):
+        page1 = self.create_page(active=True)
+        page2 = self.create_page("page2", parent=page1, active=True)
+        page3 = self.create_page("page3", parent=page2, active=False)
+        page4 = self.create_page("page4", parent=page3, active=True)
+        Site.objects.get_current()
+
+        feincms_settings.FEINCMS_PAGE_ROUTING_TABLE = True
+        try:
+            with self.assertNumQueries(2):
+                self.assertEqual(
+                    Page.objects.best_match_for_path("/test-page/page2/foo/"), page2
+                )
+            with self.assertNumQueries(1):
+                self.assertEqual(Page.objects.page_for_path("/test-page/page2/"), page2)
+            with self.assertNumQueries(0):
+                self.assertRaises(
+                    Page.DoesNotExist,
+                    lambda: Page.objects.page_for_path("/test-page/page2/foo/"),
+                )
+                self.assertRaises(
+                    Http404,
+                    lambda: Page.objects.best_match_for_path("/foo/", raise404=True),
+                )
+            # The parent of page4 is inactive, so page4 is not returned by
+            # active(); both lookups fall back to the nearest active ancestor
+            self.assertEqual(Page.objects.best_match_for_path(page4._cached_url), page2)
+            feincms_settings.FEINCMS_PAGE_ROUTING_TABLE = False
+            self.assertEqual(Page.objects.best_match_for_path(page4._cached_url), page2)
+            self.assertRaises(
+                Page.DoesNotExist,
+                lambda: Page.objects.page_for_path(page4._cached_url),
+            )
+            feincms_settings.FEINCMS_PAGE_ROUTING_TABLE = True
+            self.assertRaises(
+                Page.DoesNotExist,
+                lambda: Page.objects.page_for_path(page4._cached_url),
+            )
+
+            page3.active = True
+            page3.save()
+            with self.assertNumQueries(2):
+                self.assertEqual(
+                    Page.objects.best_match_for_path(page4._cached_url), page4
+                )
+
+            page2.slug = "other"
+            page2.save()
+            self.assertEqual(
+                Page.objects.page_for_path("/test-page/other/page3/"), page3
+            )
+            self.assertRaises(
+                Page.DoesNotExist,
+                lambda: Page.objects.page_for_path("/test-page/page2/page3/"),
+            )
+        finally:
+            feincms_settings.FEINCMS_PAGE_ROUTING_TABLE = False
+
+    def test_55_effectively_active(self):
+        page1 = self.create_page(active=True)
+        page2 = self.create_page("page2", parent=page1, active=True)
+        page3 = self.create_page("page3", parent=page2, active=False)
+        page4 = self.create_page("page4", parent=page3, active=True)
+        page5 = self.create_page("page5", parent=page1, active=True)
+
+        def states():
+            return dict(Page.objects.values_list("title", "_effectively_active"))
+
+        self.assertEqual(
+            states(),
+            {
+                "Test page": True,
+                "page2": True,
+                "page3": False,
+                "page4": False,
+                "page5": True,
+            },
+        )
+
+        page1.active = False
+        page1.save()
+        self.assertFalse(any(states().values()))
+
+        page1.active = True
+        page1.save()
+        self.assertEqual(
+            states(),
+            {
+                "Test page": True,
+                "page2": True,
+                "page3": False,
+                "page4": False,
+                "page5": True,
+            },
+        )
+
+        page3.active = True
+        page3.save()
+        self.assertTrue(all(states().values()))
+
+        page2.active = False
+        page2.save()
+        page4.move_to(page5, "last-child")
+        self.assertEqual(
+            states(),
+            {
+                "Test page": True,
+                "page2": False,
+                "page3": False,
+                "page4": True,
+                "page5": True,
+            },
+        )
+
+        page2 = Page.objects.get(pk=page2.pk)
+        page3 = Page.objects.get(pk=page3.pk)
+        page4 = Page.objects.get(pk=page4.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(page2.is_active())
+            self.assertFalse(page3.is_active())
+            self.assertFalse(page3.are_ancestors_active())
+        # The datepublisher and sites extensions add active filters which
+        # are checked for all ancestors at once
+        with self.assertNumQueries(1):
+            self.assertTrue(page4.is_active())
+        with self.assertNumQueries(1):
+            self.assertTrue(page4.are_ancestors_active())
+
+        # The field is an active filter too
+        self.assertEqual(
+            set(Page.objects.active()), {Page.objects.get(pk=page1.pk), page4, page5}
+        )
+        self.assertRaises(
+            Page.DoesNotExist, Page.objects.page_for_path, page3._cached_url
+        )
+        self.assertEqual(
+            {page.pk for page in PageSitemap().items()},
+            {page1.pk, page4.pk, page5.pk},
+        )
+
+        # Pages activated using QuerySet.update() are inactive until the
+        # field has been rebuilt
+        Page.objects.update(_effectively_active=False)
+        page5 = Page.objects.get(pk=page5.pk)
+        self.assertFalse(page5.is_active())
+        self.assertRaises(
+            Page.DoesNotExist, Page.objects.page_for_path, page5._cached_url
+        )
+
+        rebuild_effectively_active(Page)
+        self.assertEqual(Page.objects.page_for_path(page5._cached_url), page5)
+        self.assertEqual(
+            states(),
+            {
+                "Test page": True,
+                "page2": False,
+                "page3": False,
+                "page4": True,
+                "page5": True,
+            },
+        )
+
+    def test_56_descendant_url_cascade(self):
+        page1 = self.create_page(active=True)
+        page2 = self.create_page("page2", parent=page1)
+        page3 = self.create_page("page3", parent=page2)
+        page4 = self.create_page("page4", parent=page1, override_url="/elsewhere/")
+        page5 = self.create_page("page5", parent=page4)
+
+        saved = []
+
+        def handler(sender, instance, update_fields, **kwargs):
+            if update_fields == {"_cached_url"}:
+                saved.append(instance.pk)
+
+        models.signals.post_save.connect(handler, sender=Page)
+        try:
+            page1.slug = "renamed"
+            page1.save()
+            # The URLs of the subtree with an override URL do not change
+            self.assertEqual(saved, [page2.pk, page3.pk])
+
+            saved.clear()
+            feincms_settings.FEINCMS_PAGE_URL_CASCADE_SIGNALS = False
+            page1.slug = "again"
+            page1.save()
+            self.assertEqual(saved, [])
+        finally:
+            feincms_settings.FEINCMS_PAGE_URL_CASCADE_SIGNALS = True
+            models.signals.post_save.disconnect(handler, sender=Page)
+
+        self.assertEqual(
+            dict(Page.objects.values_list("pk", "_cached_url")),
+            {
+                page1.pk: "/again/",
+                page2.pk: "/again/page2/",
+                page3.pk: "/again/page2/page3/",
+                page4.pk: "/elsewhere/",
+                page5.pk: "/elsewhere/page5/",
+            },
+        )
+
+    def test_57_move_subtree(self):
+        page1 = self.create_page(active=True)
+        page2 = self.create_page("page2", parent=page1, active=True)
+        page3 = self.create_page("page3", parent=page2, active=True)
+        page4 = self.create_page("page4", active=True)
+        page1.rawcontent_set.create(region="sidebar", ordering=0, text="Side 1")
+        page4.rawcontent_set.create(region="sidebar", ordering=0, text="Side 4")
+
+        saved = []
+
+        def handler(sender, instance, update_fields, **kwargs):
+            saved.append(
+                (
+                    instance.pk,
+                    update_fields is not None and "_cached_url" in update_fields,
+                )
+            )
+
+        models.signals.post_save.connect(handler, sender=Page)
+        try:
+            self.assertEqual(
+                Page.objects.move_subtree(page2, page4, "last-child"),
+                [page2.pk, page3.pk],
+            )
+        finally:
+            models.signals.post_save.disconnect(handler, sender=Page)
+        # The moved page is saved once, its descendants get the same signals
+        # as when saving the page
+        self.assertEqual(saved, [(page2.pk, True), (page3.pk, True)])
+        self.assertEqual(
+            dict(Page.objects.values_list("pk", "_cached_url")),
+            {
+                page1.pk: "/test-page/",
+                page2.pk: "/page4/page2/",
+                page3.pk: "/page4/page2/page3/",
+                page4.pk: "/page4/",
+            },
+        )
+
+        # The inventories of the moved pages have been recomputed
+        page3 = Page.objects.get(pk=page3.pk)
+        self.assertTrue(page3._ct_inventory)
+        self.assertEqual(
+            [content.text for content in page3.content.sidebar], ["Side 4"]
+        )
+        self.assertTrue(page3.is_active())
+
+        self.assertRaises(
+            InvalidMove, Page.objects.move_subtree, page4, page3, "last-child"
+        )
+
+    def test_58_prefetch_redirect_targets(self):
+        page1 = self.create_page(active=True)
+        page2 = self.create_page("page2", active=True)
+        pages = [
+            self.create_page(
+                "redirect%s" % i,
+                active=True,
+                in_navigation=True,
+                redirect_to="page.page:%s" % target.pk,
+            )
+            for i, target in enumerate([page1, page2, page1])
+        ]
+        self.create_page(
+            "external", active=True, in_navigation=True, redirect_to="/external/"
+        )
+        self.create_page(
+            "missing", active=True, in_navigation=True, redirect_to="page.page:999"
+        )
+
+        nav = feincms_page_tags.feincms_nav({}, page1, level=1)
+        self.assertEqual(len(nav), 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [page.get_redirect_to_page() for page in nav],
+                [page1, page2, page1, None, None],
+            )
+
+        pages = list(Page.objects.filter(pk__in=[page.pk for page in pages]))
+        with self.assertNumQueries(1):
+            prefetch_redirect_targets(pages)
+        with self.assertNumQueries(0):
+            self.assertEqual(pages[1].get_redirect_to_page(), page2)
+
+    def test_59_negative_lookup_cache(self):
+        page1 = self.create_page(active=True)
+        page2 = self.create_page("page2", active=False)
+        Site.objects.get_current()
+
+        feincms_settings.FEINCMS_PAGE_NEGATIVE_CACHE_SIZE = 2
+        try:
+            self.assertRaises(
+                Page.DoesNotExist, Page.objects.best_match_for_path, "/page2/foo/"
+            )
+            with self.assertNumQueries(0):
+                self.assertRaises(
+                    Http404,
+                    Page.objects.best_match_for_path,
+                    "/page2/foo/",
+                    raise404=True,
+                )
+            self.assertRaises(Page.DoesNotExist, Page.objects.page_for_path, "/page2/")
+            with self.assertNumQueries(0):
+                self.assertRaises(
+                    Page.DoesNotExist, Page.objects.page_for_path, "/page2/"
+                )
+            # Matches are not cached
+            with self.assertNumQueries(1):
+                self.assertEqual(
+                    Page.objects.best_match_for_path("/test-page/foo/"), page1
+                )
+
+            # Activating a page invalidates the cache
+            page2.active = True
+            page2.save()
+            self.assertEqual(Page.objects.page_for_path("/page2/"), page2)
+            self.assertEqual(Page.objects.best_match_for_path("/page2/foo/"), page2)
+
+            # The cache is bounded
+            for path in ("/a/", "/b/", "/c/"):
+                self.assertRaises(Page.DoesNotExist, Page.objects.page_for_path, path)
+            with self.assertNumQueries(1):
+                self.assertRaises(Page.DoesNotExist, Page.objects.page_for_path, "/a/")
+        finally:
+            feincms_settings.FEINCMS_PAGE_NEGATIVE_CACHE_SIZE = 0
+
+    def test_60_response_cache(self):
+        page = self.create_page(active=True, template_key="theother")
+        with self.captureOnCommitCallbacks(execute=True):
+            content = page.rawcontent_set.create(
+                region="main", ordering=0, text="Hello"
+            )
+        cache.clear()
+
+        def private(page, request, response):
+            if request.GET.get("private"):
+                response["Cache-Control"] = "private"
+
+        Page.register_response_processor(private, key="test_private")
+        feincms_settings.FEINCMS_RESPONSE_CACHE_TIMEOUT = 60
+        try:
+            self.assertContains(self.client.get("/test-page/"), "Hello")
+
+            # Updating the content without sending content_changed is not
+            # noticed, the response is served from the cache
+            contents = Page.content_type_for(RawContent).objects
+            contents.update(text="Updated")
+            self.assertContains(self.client.get("/test-page/"), "Hello")
+            self.assertContains(self.client.get("/test-page/?page=2"), "Updated")
+            # Responses are cached per scheme and host
+            self.assertContains(self.client.get("/test-page/", secure=True), "Updated")
+            self.assertContains(
+                self.client.get("/test-page/", HTTP_HOST="testserver:8000"), "Updated"
+            )
+
+            with self.captureOnCommitCallbacks(execute=True):
+                content.text = "Saved"
+                content.save()
+            self.assertContains(self.client.get("/test-page/"), "Saved")
+
+            self.assertContains(self.client.get("/test-page/?private=1"), "Saved")
+            contents.update(text="Private")
+            self.assertContains(self.client.get("/test-page/?private=1"), "Private")
+
+            # Pages rendering CSRF tokens are not cached
+            with self.captureOnCommitCallbacks(execute=True):
+                page.templatecontent_set.create(
+                    region="main", ordering=1, template="templatecontent_csrf.html"
+                )
+            self.assertContains(self.client.get("/test-page/"), "csrfmiddlewaretoken")
+            contents.update(text="Form")
+            self.assertContains(self.client.get("/test-page/"), "Form")
+
+            # Django < 4.1 sets CSRF_COOKIE_USED when accessing the token
+            def get_token(request):
+                token = csrf.get_token(request)
+                del request.META["CSRF_COOKIE_NEEDS_UPDATE"]
+                request.META["CSRF_COOKIE_USED"] = True
+                return token
+
+            with mock.patch("django.template.context_processors.get_token", get_token):
+                self.assertContains(self.client.get("/test-page/"), "Form")
+                contents.update(text="Old Django")
+                self.assertContains(self.client.get("/test-page/"), "Old Django")
+        finally:
+            feincms_settings.FEINCMS_RESPONSE_CACHE_TIMEOUT = 0
+            del Page.response_processors["test_private"]
+
+    def test_61_conditional_get(self):
+        page = self.create_page(active=True, template_key="theother")
+        with self.captureOnCommitCallbacks(execute=True):
+            content = page.rawcontent_set.create(
+                region="main", ordering=0, text="Hello"
+            )
+
+        response = self.client.get("/test-page/")
+        self.assertContains(response, "Hello")
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        # The content blocks are not loaded for answering conditional requests
+        with self.assertNumQueries(2):
+            response = self.client.get("/test-page/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            content.text = "Changed"
+            content.save()
+        response = self.client.get("/test-page/", HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Changed")
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = response["ETag"]
+        self.create_page("Another page", active=True)
+        response = self.client.get("/test-page/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # The modification date is updated once per transaction
+        with self.captureOnCommitCallbacks() as callbacks:
+            content.save()
+            page.rawcontent_set.create(region="main", ordering=1, text="More")
+        self.assertEqual(
+            len(
+                [
+                    callback
+                    for callback in callbacks
+                    if callback.feincms_key[0] == "conditional_get"
+                ]
+            ),
+            1,
+        )
+
+        # Pages rendering CSRF tokens do not get any validators, also on
+        # Django < 4.1 which sets CSRF_COOKIE_USED when accessing the token
+        page.templatecontent_set.create(
+            region="main", ordering=2, template="templatecontent_csrf.html"
+        )
+        response = self.client.get("/test-page/")
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        def get_token(request):
+            token = csrf.get_token(request)
+            del request.META["CSRF_COOKIE_NEEDS_UPDATE"]
+            request.META["CSRF_COOKIE_USED"] = True
+            return token
+
+        with mock.patch("django.template.context_processors.get_token", get_token):
+            response = self.client.get("/test-page/")
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertFalse(response.has_header("ETag"))
+        page.templatecontent_set.all().delete()
+        response = self.client.get("/test-page/")
+
+        # Caches which do not store the page generation never answer
+        # conditional requests
+        etag = response["ETag"]
+        with mock.patch.object(routing, "cache", DummyCache("dummy", {})):
+            response = self.client.get("/test-page/", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(
+                self.client.get("/test-page/")["ETag"], response["ETag"]
+            )
+
+    def test_62_handler_timings(self):
+        page = self.create_page(active=True, template_key="theother")
+        page.rawcontent_set.create(region="main", ordering=0, text="Hello")
+
+        response = self.client.get("/test-page/")
+        self.assertFalse(response.has_header("Server-Timing"))
+
+        received = []
+
+        def receiver(sender, instance, request, response, timings, **kwargs):
+            received.append((instance, dict(timings.stages)))
+
+        handler_timings.connect(receiver)
+        feincms_settings.FEINCMS_SERVER_TIMING_HEADER = True
+        try:
+            response = self.client.get("/test-page/")
+        finally:
+            feincms_settings.FEINCMS_SERVER_TIMING_HEADER = False
+            handler_timings.disconnect(receiver)
+
+        self.assertContains(response, "Hello")
+        self.assertEqual(len(received), 1)
+        instance, stages = received[0]
+        self.assertEqual(instance, page)
+        for stage in (
+            "lookup",
+            "request.redirect",
+            "request.extra_context",
+            "region.main",
+            "content.RawContent",
+            "render",
+            "total",
+        ):
+            self.assertIn(stage, stages)
+
+        header = response["Server-Timing"]
+        self.assertIn("request.redirect;dur=", header)
+        self.assertIn("region.main;dur=", header)
+
+    def test_63_processor_chains(self):
+        page = self.create_page(active=True, template_key="theother")
+        page.rawcontent_set.create(region="main", ordering=0, text="Hello")
+        cache.clear()
+
+        chain = Page.request_processors.chain("request", "GET", reverse=True)
+        self.assertIs(
+            Page.request_processors.chain("request", "GET", reverse=True), chain
+        )
+        self.assertEqual(chain[-1][0], "request.redirect")
+
+        @processor_options(methods=("POST",))
+        def only_post(page, request):
+            return HttpResponse("Posted")
+
+        served = []
+
+        @processor_options(needs_content=False)
+        def count(page, request, response):
+            served.append(request.path)
+            response["X-Served"] = len(served)
+
+        Page.register_request_processor(only_post, key="test_only_post")
+        Page.register_response_processor(count, key="test_count")
+        feincms_settings.FEINCMS_RESPONSE_CACHE_TIMEOUT = 60
+        try:
+            self.assertIsNot(
+                Page.request_processors.chain("request", "GET", reverse=True), chain
+            )
+            self.assertContains(self.client.get("/test-page/"), "Hello")
+            self.assertContains(self.client.post("/test-page/"), "Posted")
+
+            # Processors not needing content also run for cached responses
+            Page.content_type_for(RawContent).objects.update(text="Updated")
+            response = self.client.get("/test-page/")
+            self.assertContains(response, "Hello")
+            self.assertEqual(response["X-Served"], "2")
+        finally:
+            feincms_settings.FEINCMS_RESPONSE_CACHE_TIMEOUT = 0
+            del Page.request_processors["test_only_post"]
+            del Page.response_processors["test_count"]
+
+        self.assertEqual(
+            Page.request_processors.chain("request", "GET", reverse=True), chain
+        )
+
+    def test_64_streaming_responses(self):
+        page = self.create_page(active=True, template_key="theother")
+        page.rawcontent_set.create(region="main", ordering=0, text="Hello")
+        page.rawcontent_set.create(region="sidebar", ordering=0, text="Aside")
+
+        feincms_settings.FEINCMS_STREAMING_RESPONSES = True
+        try:
+            response = self.client.get("/test-page/")
+            self.assertTrue(response.streaming)
+            chunks = [force_str(chunk) for chunk in response.streaming_content]
+
+            # The head is sent before any region has been rendered
+            self.assertIn("<title>Test page</title>", chunks[0])
+            self.assertNotIn("Hello", chunks[0])
+            content = "".join(chunks)
+            self.assertLess(content.index("Hello"), content.index("Aside"))
+            self.assertNotIn("feincms-region", content)
+
+            received = []
+
+            def receiver(sender, timings, **kwargs):
+                received.append(dict(timings.stages))
+
+            handler_timings.connect(receiver)
+            feincms_settings.FEINCMS_SERVER_TIMING_HEADER = True
+            try:
+                response = self.client.get("/test-page/")
+                self.assertIn("render;dur=", response["Server-Timing"])
+                self.assertEqual(received, [])
+                self.assertContains(response, "Aside")
+            finally:
+                feincms_settings.FEINCMS_SERVER_TIMING_HEADER = False
+                handler_timings.disconnect(receiver)
+            self.assertIn("region.sidebar", received[0])
+            self.assertIn("stream", received[0])
+
+            # Regions assigned to variables or rendered inside tags whose
+            # output is cached or captured are rendered immediately
+            request = Empty()
+            request._feincms_deferred_regions = DeferredRegions()
+            context = template.Context({"feincms_page": page, "request": request})
+            self.assertEqual(
+                template.Template(
+                    "{% load feincms_tags %}"
+                    '{% feincms_render_region feincms_page "main" request as main %}'
+                    "{% if main %}[{{ main }}]{% endif %}"
+                ).render(context),
+                "[Hello]",
+            )
+            self.assertEqual(
+                template.Template(
+                    "{% load cache feincms_tags %}{% cache 60 streaming_test %}"
+                    '{% feincms_render_region feincms_page "sidebar" request %}'
+                    "{% endcache %}"
+                ).render(context),
+                "Aside",
+            )
+            self.assertEqual(request._feincms_deferred_regions.regions, [])
+
+            # Templates have to opt into streaming
+            Page.objects.filter(pk=page.pk).update(template_key="base")
+            response = self.client.get("/test-page/")
+            self.assertFalse(response.streaming)
+            self.assertContains(response, "Hello")
+            Page.objects.filter(pk=page.pk).update(template_key="theother")
+
+            # Application contents may set headers, do not stream
+            page.applicationcontent_set.create(
+                region="main",
+                ordering=1,
+                urlconf_path="testapp.applicationcontent_urls",
+            )
+            response = self.client.get("/test-page/")
+            self.assertFalse(response.streaming)
+            self.assertContains(response, "Hello")
+        finally:
+            feincms_settings.FEINCMS_STREAMING_RESPONSES = False
+
+    def test_65_content_cache_ct_tracker(self):
+        page1 = self.create_page()
+        page2 = self.create_page("page2", parent=page1)
+        sidebar = page1.rawcontent_set.create(region="sidebar", ordering=0, text="Old")
+        page2.rawcontent_set.create(region="main", ordering=0, text="Child")
+
+        class CachedTrackerContentProxy(TrackerContentProxy):
+            content_cache = ContentCache(10)
+
+        def sidebar_texts():
+            page = Page.objects.get(pk=page2.pk)
+            page.content_proxy_class = CachedTrackerContentProxy
+            return [content.text for content in page.content.sidebar]
+
+        self.assertEqual(sidebar_texts(), ["Old"])
+        self.assertEqual(sidebar_texts(), ["Old"])
+
+        sidebar.text = "New"
+        sidebar.save()
+        self.assertEqual(sidebar_texts(), ["New"])
+
+        page1.rawcontent_set.create(region="sidebar", ordering=1, text="Added")
+        self.assertEqual(sidebar_texts(), ["New", "Added"])
+
+        # Other processes notice changes through the generations, which are
+        # incremented for the descendants too
+        Page.content_type_for(RawContent).objects.filter(region="sidebar").update(
+            text="Updated"
+        )
+        bump_content_generation(Page, page1.pk)
+        self.assertEqual(sidebar_texts(), ["Updated", "Updated"])
+
+        # Moving pages increments the generations of the moved pages and of
+        # their descendants
+        page3 = self.create_page("page3", parent=page1)
+        page4 = self.create_page("page4", parent=page3)
+        page5 = self.create_page("page5")
+        with self.captureOnCommitCallbacks(execute=True):
+            page3.move_to(page5, "last-child")
+        self.assertEqual(
+            dict(
+                Page.objects.filter(
+                    pk__in=[page1.pk, page3.pk, page4.pk, page5.pk]
+                ).values_list("pk", "content_generation")
+            ),
+            {page1.pk: 1, page3.pk: 1, page4.pk: 1, page5.pk: 0},
+        )
+
+    def test_66_ct_tracker_coalesced_updates(self):
+        page1 = self.create_page()
+        page2 = self.create_page("page2", parent=page1)
+        Page.objects.get(pk=page2.pk).save()
+
+        # The inventory is recomputed once per transaction and the object in
+        # hand does not keep an outdated inventory
+        page1 = Page.objects.get(pk=page1.pk)
+        page1.save()
+        self.assertTrue(page1._ct_inventory)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for ordering in range(10):
+                page1.rawcontent_set.create(
+                    region="sidebar", ordering=ordering, text="%s" % ordering
+                )
+            self.assertFalse(page1._ct_inventory)
+            self.assertFalse(Page.objects.get(pk=page1.pk)._ct_inventory)
+        self.assertEqual(
+            len(
+                [
+                    callback
+                    for callback in callbacks
+                    if callback.feincms_key[0] == "ct_tracker"
+                ]
+            ),
+            1,
+        )
+        self.assertEqual(
+            len(Page.objects.get(pk=page1.pk)._ct_inventory["sidebar"]), 10
+        )
+        self.assertEqual(Page.objects.get(pk=page2.pk)._ct_inventory, {})
+
+        # Copying content blocks recomputes the inventory once, too
+        page3 = self.create_page("page3")
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            page3.copy_content_from(page1)
+        self.assertEqual(
+            len(
+                [
+                    callback
+                    for callback in callbacks
+                    if callback.feincms_key[0] == "ct_tracker"
+                ]
+            ),
+            1,
+        )
+        self.assertEqual(
+            len(Page.objects.get(pk=page3.pk)._ct_inventory["sidebar"]), 10
+        )
+
+    def test_67_page_generation_invalidation(self):
+        page1 = self.create_page(active=True)
+        page2 = self.create_page("page2", parent=page1)
+        self.create_page("page3", parent=page2)
+
+        with mock.patch.object(
+            routing, "_new_generation", wraps=routing._new_generation
+        ) as new_generation:
+            # Subpages whose URL changed do not change the generation again
+            page1.slug = "renamed"
+            page1.save()
+            self.assertEqual(new_generation.call_count, 1)
+
+            # Other models do not change the generation
+            Category.objects.create(title="Category", slug="category")
+            self.assertEqual(new_generation.call_count, 1)
+
+            # Nothing uses the generation
+            Page._feincms_page_generation_used = False
+            try:
+                page1.save()
+            finally:
+                Page._feincms_page_generation_used = True
+            self.assertEqual(new_generation.call_count, 1)
+
+    def test_68_single_query_column_types(self):
+        page = self.create_page()
+        mediafile = MediaFile.objects.create(file="somefile.jpg")
+        page.rawcontent_set.create(region="main", ordering=0, text="Raw")
+        page.mediafilecontent_set.create(
+            region="main", ordering=1, mediafile=mediafile, type="default"
+        )
+        page.templatecontent_set.create(
+            region="main", ordering=2, template="templatecontent_1.html"
+        )
+        page.applicationcontent_set.create(
+            region="main",
+            ordering=3,
+            urlconf_path="testapp.applicationcontent_urls",
+            parameters={"exclusive_subpages": True},
+        )
+
+        class SingleQueryContentProxy(ContentProxy):
+            single_query = True
+
+        page = Page.objects.get(pk=page.pk)
+        page.content_proxy_class = SingleQueryContentProxy
+        with CaptureQueriesContext(connection) as queries:
+            main = page.content.main
+        self.assertEqual(len(queries), 1)
+
+        # Padded columns (foreign keys, texts, strings) are typed
+        sql = queries[0]["sql"]
+        field = page.mediafilecontent_set.model._meta.get_field("mediafile")
+        self.assertIn("CAST(NULL AS %s)" % field.cast_db_type(connection), sql)
+        self.assertNotIn("NULL", sql.replace("CAST(NULL AS", ""))
+
+        self.assertEqual(
+            [content.__class__.__name__ for content in main],
+            ["RawContent", "MediaFileContent", "TemplateContent", "ApplicationContent"],
+        )
+        self.assertEqual(main[0].text, "Raw")
+        self.assertEqual(main[1].mediafile_id, mediafile.pk)
+        self.assertEqual(main[1].type, "default")
+        self.assertEqual(main[2].template, "templatecontent_1.html")
+        self.assertEqual(main[3].parameters, {"exclusive_subpages": True})
+
+    def test_69_prefetch_content_ancestors(self):
+        root = self.create_page("Root")
+        root.rawcontent_set.create(region="sidebar", ordering=0, text="Root")
+        for i in range(10):
+            self.create_page("Child %s" % i, parent=root)
+        Page.objects.update(_ct_inventory=None)
+
+        # The count query, one query for the ancestors of all pages, the
+        # counts of the ancestors and the RawContent instances, regardless
+        # of the number of pages
+        for count in (2, 10):
+            pages = list(Page.objects.filter(parent=root).order_by("id")[:count])
+            self.assertNumQueries(4, lambda: prefetch_content(pages))
+            self.assertEqual(
+                [page.content.sidebar[0].text for page in pages], ["Root"] * count
+            )
+
+    def test_70_tree_editor_move_subtree_inventories(self):
+        page1 = self.create_page()
+        page2 = self.create_page("page2", parent=page1)
+        page3 = self.create_page("page3", parent=page2)
+        page4 = self.create_page("page4", parent=page2)
+        page5 = self.create_page("page5", parent=page2, template_key="theother")
+        target = self.create_page("target")
+        with self.captureOnCommitCallbacks(execute=True):
+            page1.rawcontent_set.create(region="sidebar", ordering=0, text="Old")
+            page3.rawcontent_set.create(region="sidebar", ordering=0, text="Own")
+            page5.rawcontent_set.create(region="sidebar", ordering=0, text="Own")
+            target.rawcontent_set.create(region="sidebar", ordering=0, text="New")
+        inventories = dict(Page.objects.values_list("pk", "_ct_inventory"))
+
+        self.login()
+        with mock.patch.object(
+            ct_tracker, "rebuild_inventories", wraps=ct_tracker.rebuild_inventories
+        ) as rebuild:
+            self.client.post(
+                "/admin/page/page/",
+                {
+                    "__cmd": "move_node",
+                    "position": "last-child",
+                    "cut_item": page2.pk,
+                    "pasted_on": target.pk,
+                },
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+            )
+
+        # Only page4 inherits content from outside the moved subtree; page3
+        # and page5 have their own sidebar content
+        self.assertEqual(rebuild.call_count, 1)
+        self.assertEqual(rebuild.call_args.kwargs["pks"], [page4.pk])
+        new_inventories = dict(Page.objects.values_list("pk", "_ct_inventory"))
+        self.assertEqual(new_inventories[page3.pk], inventories[page3.pk])
+        self.assertEqual(new_inventories[page5.pk], inventories[page5.pk])
+        self.assertEqual(
+            [content.text for content in Page.objects.get(pk=page4.pk).content.sidebar],
+            ["New"],
+        )
+        self.assertEqual(
+            [content.text for content in Page.objects.get(pk=page2.pk).content.sidebar],
+            ["New"],
+        )
+
+    def test_71_ct_tracker_content_order(self):
+        page = self.create_page()
+        first = page.rawcontent_set.create(region="main", ordering=0, text="A")
+        second = page.rawcontent_set.create(region="main", ordering=1, text="B")
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.get(pk=page.pk).save()
+
+        def texts():
+            return [c.text for c in Page.objects.get(pk=page.pk).content.main]
+
+        self.assertEqual(texts(), ["A", "B"])
+
+        # Content blocks created without sending signals are not lost
+        page.rawcontent_set.model.objects.bulk_create(
+            [
+                page.rawcontent_set.model(
+                    parent=page, region="main", ordering=2, text="C"
+                )
+            ]
+        )
+        self.assertEqual(texts(), ["A", "B", "C"])
+
+        # Reordering without updating the inventory uses the current ordering
+        page.rawcontent_set.filter(pk=first.pk).update(ordering=3)
+        self.assertEqual(texts(), ["B", "C", "A"])
+        page.rawcontent_set.filter(pk=second.pk).delete()
+        self.assertEqual(texts(), ["C", "A"])
+
+    def test_72_cms_404_page_response_cache(self):
+        page = self.create_page("notfound", active=True, template_key="theother")
+        with self.captureOnCommitCallbacks(execute=True):
+            page.rawcontent_set.create(region="main", ordering=0, text="Not here")
+        cache.clear()
+        Site.objects.get_current()
+
+        feincms_settings.FEINCMS_CMS_404_PAGE = "/notfound/"
+        feincms_settings.FEINCMS_PAGE_NEGATIVE_CACHE_SIZE = 10
+        feincms_settings.FEINCMS_RESPONSE_CACHE_TIMEOUT = 60
+        try:
+            response = self.client.get("/unknown/")
+            self.assertContains(response, "Not here", status_code=404)
+
+            # Neither the unknown path nor the 404 page are looked up again
+            Page.content_type_for(RawContent).objects.update(text="Updated")
+            with self.assertNumQueries(0):
+                response = self.client.get("/unknown/")
+            self.assertContains(response, "Not here", status_code=404)
+            with self.assertNumQueries(1):
+                response = self.client.get("/other/")
+            self.assertContains(response, "Not here", status_code=404)
+
+            # The 404 page itself is still served with its own status code
+            self.assertContains(self.client.get("/notfound/"), "Updated")
+
+            # Saving any page invalidates the cached 404 response
+            with self.captureOnCommitCallbacks(execute=True):
+                page.save()
+            self.assertContains(
+                self.client.get("/unknown/"), "Updated", status_code=404
+            )
+        finally:
+            feincms_settings.FEINCMS_CMS_404_PAGE = None
+            feincms_settings.FEINCMS_PAGE_NEGATIVE_CACHE_SIZE = 0
+            feincms_settings.FEINCMS_RESPONSE_CACHE_TIMEOUT = 0
@@ -5,12 +5,13 @@
 import doctest
 from datetime import datetime
 
+from django.forms.widgets import Media, media_property
 from django.test import TestCase
 from django.utils.encoding import force_str
 
 import feincms
 from feincms.extensions.datepublisher import granular_now
-from feincms.models import Region, Template
+from feincms.models import Region, Template, _content_media_kind
 from feincms.utils import get_object, shorten_string
 from feincms.utils.tuple import AutoRenderTuple
 
@@ -45,6 +46,36 @@ class ModelsTest(TestCase):
         self.assertEqual(r.key, t.regions[0].key)
         self.assertEqual(force_str(r), "region title")
 
+    def test_content_media_kind(self):
+        class NoMedia:
+            pass
+
+        class ClassMedia:
+            media = Media(js=("class.js",))
+
+        class InstanceMedia(ClassMedia):
+            @property
+            def media(self):
+                return Media(js=("%s.js" % id(self),))
+
+        class PropertyMedia(ClassMedia):
+            class Media:
+                js = ("property.js",)
+
+        PropertyMedia.media = media_property(PropertyMedia)
+
+        class ExtendedInstanceMedia(InstanceMedia):
+            class Media:
+                js = ("extended.js",)
+
+        ExtendedInstanceMedia.media = media_property(ExtendedInstanceMedia)
+
+        self.assertIsNone(_content_media_kind(NoMedia))
+        self.assertEqual(_content_media_kind(ClassMedia), "class")
+        self.assertEqual(_content_media_kind(InstanceMedia), "instance")
+        self.assertEqual(_content_media_kind(PropertyMedia), "class")
+        self.assertEqual(_content_media_kind(ExtendedInstanceMedia), "instance")
+
 
 class UtilsTest(TestCase):
     def test_get_object(self):